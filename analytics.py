@@ -0,0 +1,132 @@
+# analytics.py - Carga académica por día, semana y categoría (pandas), calculada una vez por versión del store
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from lru import LRUCache
+from recurrence import WEEKDAY_NAMES
+from screening import get_matcher
+
+HORIZON_DAYS = 42   # seis semanas desde hoy: recomendaciones + mapa de calor
+OVERLOAD = 3        # eventos en un día para considerarlo cargado
+BUSY_WEEK = 12      # eventos en una semana (lunes a domingo) para destacarla en las recomendaciones
+# categoría por título (sin tildes, minúsculas); la primera que calce gana. Las evaluaciones salen del
+# léxico compartido (screening.py), el mismo que usa el chat
+CATEGORIES = {
+    "evaluacion": get_matcher().pattern("evaluacion"),
+    "clase": r"\b(?:clase|catedra|ayudantia|laboratorio|taller)",
+}
+CATEGORY_ORDER = list(CATEGORIES) + ["otro"]
+
+
+def fold_titles(titles):
+    # vectorizado: "Certamen Cálculo" -> "certamen calculo"
+    return titles.str.normalize("NFKD").str.encode("ascii", "ignore").str.decode("ascii").str.lower()
+
+def events_frame(index, start, end):
+    """Un registro por ocurrencia en [start, end] (series ya expandidas): date, title, time, category."""
+    rows = index.between(start, end)
+    df = pd.DataFrame({
+        "date": pd.to_datetime([d for d, _ in rows]),
+        "title": pd.Series([e.get("title") or "" for _, e in rows], dtype=object),
+        "time": pd.Series([e.get("time") or "" for _, e in rows], dtype=object),
+    })
+    folded = fold_titles(df["title"])
+    df["category"] = np.select([folded.str.contains(p, regex=True) for p in CATEGORIES.values()],
+                               list(CATEGORIES), default="otro") if len(df) else pd.Series([], dtype=object)
+    return df
+
+
+class Workload:
+    """Conteos por día y categoría de una ventana; el resto de las métricas sale de ahí sin recorrer eventos."""
+
+    def __init__(self, frame, start, end):
+        self.start, self.end = start, end
+        days = pd.date_range(start, end, freq="D")
+        per_day = frame.groupby(["date", "category"]).size().unstack(fill_value=0) if len(frame) else pd.DataFrame()
+        self.daily = per_day.reindex(index=days, columns=CATEGORY_ORDER, fill_value=0).astype(int)
+        self.total = self.daily.sum(axis=1)
+        self.by_category = self.daily.sum()
+        self._memo = {}  # (consulta, desde, hasta) -> resultado; el Workload ya vive en caché por versión
+
+    def _memoized(self, name, start, end, build):
+        key = (name, start, end)
+        if key not in self._memo:
+            self._memo[key] = build()
+        return self._memo[key]
+
+    def _window(self, series, start, end):
+        return series.loc[pd.Timestamp(start):pd.Timestamp(end)]
+
+    def weekly(self):
+        """Eventos por semana, indexados por el lunes que la inicia."""
+        return self._memoized("weekly", self.start, self.end,
+                              lambda: self.total.resample("W-MON", label="left", closed="left").sum())
+
+    def busiest_week(self):
+        """(lunes, eventos) de la semana más cargada de la ventana, o (None, 0) si no hay eventos."""
+        weeks = self.weekly()
+        if weeks.empty or not weeks.any():
+            return None, 0
+        monday = weeks.idxmax()
+        return monday.date(), int(weeks.loc[monday])
+
+    def overloaded(self, start, end):
+        return self._memoized("overloaded", start, end, lambda: self._overloaded(start, end))
+
+    def evaluations(self, start, end):
+        return self._memoized("evaluations", start, end, lambda: int(self._window(self.daily["evaluacion"], start, end).sum()))
+
+    def evaluation_peak(self, start, end):
+        """(máximo de evaluaciones en 7 días seguidos, primer día de esa ventana) dentro de [start, end]."""
+        return self._memoized("evaluation_peak", start, end, lambda: self._evaluation_peak(start, end))
+
+    def free_gaps(self, start, end):
+        """[(desde, hasta, días)] de tramos sin eventos dentro de [start, end], del más largo al más corto."""
+        return self._memoized("free_gaps", start, end, lambda: self._free_gaps(start, end))
+
+    def _overloaded(self, start, end):
+        total = self._window(self.total, start, end)
+        return [ts.date() for ts in total.index[total.to_numpy() >= OVERLOAD]]
+
+    def _evaluation_peak(self, start, end, days=7):
+        ev = self._window(self.daily["evaluacion"], start, end)
+        if ev.empty or not ev.any():
+            return 0, None
+        rolling = ev[::-1].rolling(days, min_periods=1).sum()[::-1]  # ventana hacia adelante desde cada día
+        first = rolling.idxmax()
+        return int(rolling.loc[first]), first.date()
+
+    def _free_gaps(self, start, end):
+        total = self._window(self.total, start, end)
+        free = total.to_numpy() == 0
+        if not free.any():
+            return []
+        run = np.cumsum(~free)[free]  # los días libres seguidos comparten el número de días ocupados previos
+        dates = total.index[free]
+        groups = pd.Series(dates, index=dates).groupby(run).agg(["first", "last", "size"])
+        groups = groups.sort_values(["size", "first"], ascending=[False, True])
+        return [(r.first.date(), r.last.date(), int(r.size)) for r in groups.itertuples()]
+
+    def heatmap(self):
+        """Tabla semana x día de la semana con la cantidad de eventos (para el mapa de calor)."""
+        idx = self.total.index
+        df = pd.DataFrame({"semana": (idx - pd.to_timedelta(idx.weekday, unit="D")).date,
+                           "dia": np.asarray(WEEKDAY_NAMES)[idx.weekday],
+                           "fecha": idx.date, "eventos": self.total.to_numpy()})
+        return df
+
+
+def workload(index, today=None, days=HORIZON_DAYS):
+    today = today or date.today()
+    end = today + timedelta(days=days)
+    return Workload(events_frame(index, today, end), today, end)
+
+
+workload_cache = LRUCache(max_entries=64)
+
+def cached_workload(user, index, version, today=None):
+    """Workload del usuario; se recalcula solo cuando cambia la versión del store (o el día)."""
+    today = today or date.today()
+    return workload_cache.get(("workload", user, version, today), lambda: workload(index, today))
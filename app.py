@@ -1,13 +1,69 @@
 # app.py - ANIMA con Calendario Inteligente (vista mensual, recordatorios, persistencia por usuario)
 import streamlit as st
-from groq import Groq
-import os, json
+import altair as alt
+import pandas as pd
+import os, io, time, uuid
 from datetime import date, datetime, timedelta
+from contextlib import contextmanager
 import calendar
+from storage import get_store
+from reminders import InboxSink, get_scheduler
+import assistant
+from llm_gateway import get_gateway
+from reply_cache import get_reply_cache
+from context import ConversationContext, llm_summarizer
+from chatlog import RecentTurns, get_chat_log
+from events import EventIndex, parse_date, search_events, upcoming_events
+from recurrence import WEEKDAY_NAMES, rule_of
+from calendar_io import import_events, iter_csv, iter_ics, open_text, write_csv, write_ics
+from recommendations import smart_recommendations
+from analytics import cached_workload
+from month_grid import cached_month_html, shift_month
+from forums import GROUPS, ForumView, get_forum_store
+from metrics import get_registry
+from wellbeing import WINDOW, get_survey_store
+from screening import get_matcher
+from runtime import freeze_startup_heap
+
+# los módulos importados viven todo el proceso: se congelan una vez para que el GC de fin de rerun no los recorra
+freeze_startup_heap()
 
 # ---------------- PAGE CONFIG ----------------
 st.set_page_config(page_title="ANIMA - Apoyo Emocional UDD", layout="wide", page_icon="💙")
 
+# ---------------- METRICS (tiempos por fase, ver metrics.py) ----------------
+rerun = get_registry().start_rerun()
+rerun.tag(view=st.session_state.get("menu_choice", "Chat de ayuda"))
+
+# ---------------- FRAGMENTS (reruns parciales) ----------------
+# el chat, la navegación de meses y el foro son fragmentos: sus clics reejecutan solo ese panel, sin volver a
+# pasar por login, encuesta, carga del usuario, recomendaciones ni guardado. Un fragmento nunca modifica
+# user_data (lo que cambia el calendario hace st.rerun() completo). ANIMA_FRAGMENTS=0 vuelve a reruns completas.
+FRAGMENTS = os.getenv("ANIMA_FRAGMENTS", "1") != "0"
+
+def fragment(fn=None, run_every=None):
+    if not FRAGMENTS:
+        return fn if fn is not None else (lambda f: f)
+    return st.fragment(fn, run_every=run_every)
+
+def rerun_pane():
+    # scope="fragment" solo vale cuando Streamlit está reejecutando únicamente el fragmento
+    st.rerun(scope="fragment" if FRAGMENTS and rerun.finished else "app")
+
+@contextmanager
+def pane_metrics(view, events=None):
+    """Dentro de la rerun completa las fases van a la del script; si Streamlit reejecuta solo el fragmento
+    (la rerun del script ya terminó) se mide como una rerun propia de esa vista."""
+    if not rerun.finished:
+        yield rerun
+        return
+    run = get_registry().start_rerun()
+    run.tag(view=view, events=events)
+    try:
+        yield run
+    finally:
+        run.finish()
+
 # ---------------- FORCE LIGHT THEME + STYLES ----------------
 st.markdown("""
 <style>
@@ -58,57 +114,75 @@ if st.session_state.menu_open:
         st.markdown("---")
         st.caption("ANIMA · Apoyo Emocional UDD 💙")
 
-# ---------------- GROQ CLIENT (if not available, app still runs but IA responses will show error) ----------------
-client = None
-try:
-    client = Groq(api_key=os.getenv("GROQ_API_KEY"))
-except Exception:
-    client = None
+# ---------------- GROQ GATEWAY (if not available, app still runs but IA responses will show error) ----------------
+# un solo cliente y pool por proceso, con tope de concurrencia, rate limit y reintentos (ver llm_gateway.py)
+gateway = get_gateway()
+# respuestas repetidas ("estoy estresado por el certamen") salen de caché; los mensajes de riesgo nunca
+reply_cache = get_reply_cache()
+
+# ANIMA_STREAM=0 vuelve a la respuesta bloqueante (sin streaming)
+STREAM_REPLIES = os.getenv("ANIMA_STREAM", "1") != "0"
+
+def chat_context():
+    # memoria de la conversación acotada por tokens (ANIMA_CTX_BUDGET); los turnos viejos van a un resumen
+    if "chat_ctx" not in st.session_state:
+        st.session_state.chat_ctx = ConversationContext(budget=int(os.getenv("ANIMA_CTX_BUDGET", "1500")),
+                                                        summarizer=llm_summarizer(gateway))
+    return st.session_state.chat_ctx
+
+def chat_turns():
+    # en sesión solo los últimos ANIMA_CHAT_RING turnos; la conversación completa queda en el chatlog del usuario
+    if "chat_hist" not in st.session_state:
+        st.session_state.chat_hist = RecentTurns(int(os.getenv("ANIMA_CHAT_RING", "20")))
+        st.session_state.chat_session = uuid.uuid4().hex[:8]
+    return st.session_state.chat_hist
+
+def context_messages(prompt):
+    turns = chat_turns()
+    return chat_context().build(assistant.system_messages(), turns.turns, prompt, offset=turns.offset)
+
+def record_turn(username, turn):
+    """Agrega el turno al anillo de la sesión y al log en disco; sus métricas (tokens del prompt, ttft, total)
+    van a los histogramas del registro (export Prometheus)."""
+    get_registry().observe_reply(turn["prompt_tokens"], turn.get("ttft"), turn.get("total"),
+                                 streamed="total" in turn, cached=turn.get("cached", False))
+    turns = chat_turns()
+    turns.append(turn)
+    get_chat_log().append(username, {"ts": datetime.now().isoformat(timespec="seconds"), "session": st.session_state.chat_session,
+                                     "user": turn["user"], "bot": turn["bot"], "risk": turn.get("risk")})
+    turns.trim(chat_context().folded)
+
+HISTORY_PER_PAGE = 20  # turnos por página en "Historial"
 
 def ai_reply(prompt):
     """Llamada segura a Groq; si falla, devuelve texto por defecto."""
-    if client is None:
-        return "ANIMA no puede conectarse al servicio de IA en este momento. Igual puedo ayudarte con tu calendario."
-    try:
-        # Instrucción de sistema con enlace a WhatsApp en caso de riesgo
-        system_instruction = (
-            "Eres ANIMA, un asistente empático de la UDD que ayuda a planificar y cuidar el bienestar. "
-            "Si detectas que el usuario expresa angustia severa, pensamientos de riesgo o solicita ayuda profesional explícita, "
-            "DEBES finalizar tu respuesta sugiriendo contactar a los especialistas y proporcionar este enlace de WhatsApp: "
-            "https://wa.me/569XXXXXXXX (Indícalo amablemente)."
-        )
-        
-        resp = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {"role":"system", "content": system_instruction},
-                {"role":"user", "content": prompt}
-            ]
-        )
-        return resp.choices[0].message.content
-    except Exception as e:
-        return f"ANIMA no pudo generar respuesta automática ({e})."
+    return assistant.ai_reply(gateway, prompt, cache=reply_cache, messages=context_messages(prompt))
+
+def ai_reply_stream(prompt, started=None):
+    """Igual que ai_reply pero entrega los tokens a medida que llegan (ver assistant.ReplyStream). `started`:
+    cuándo llegó el mensaje, para que el ttft incluya armar el contexto (y el resumen, si toca)."""
+    return assistant.ReplyStream(gateway, prompt, cache=reply_cache, messages=context_messages(prompt), started=started)
 
 # ---------------- Persistence utils ----------------
-def user_file(username):
-    safe = username.replace(" ", "_")
-    return f"calendar_{safe}.json"
+# SQLite por defecto (ANIMA_STORAGE=json para los archivos calendar_<user>.json); migra el JSON en la primera carga
+store = get_store()
 
 def load_user_data(username):
-    f = user_file(username)
-    if os.path.exists(f):
-        try:
-            with open(f,"r",encoding="utf-8") as fh:
-                return json.load(fh)
-        except Exception:
-            return {"events": [], "prefs": {}}
-    else:
-        return {"events": [], "prefs": {}}
+    return store.load(username)
 
 def save_user_data(username, data):
-    f = user_file(username)
-    with open(f,"w",encoding="utf-8") as fh:
-        json.dump(data, fh, ensure_ascii=False, indent=4)
+    # solo escribe si algo cambió desde la carga (las reruns "limpias" no tocan disco)
+    return store.save(username, data)
+
+# planificador de recordatorios: un hilo por proceso para todos los usuarios (ANIMA_REMINDERS=0 lo apaga)
+scheduler = get_scheduler(store)
+
+def user_reminders(username, index, days=3):
+    """Próximos eventos ya calculados por el planificador; recorre el índice si aún no cargó al usuario o si
+    se piden más días de los que mira (ANIMA_REMINDER_DAYS)."""
+    if scheduler is not None and days <= scheduler.days and scheduler.knows(username):
+        return scheduler.upcoming(username, days=days)
+    return upcoming_events(index, days=days)
 
 # ---------------- Login & Session init ----------------
 if "logged_in" not in st.session_state:
@@ -144,7 +218,8 @@ if not st.session_state.logged_in:
 
 # load user data
 user = st.session_state.user
-user_data = load_user_data(user)  # {"events":[...], "prefs": {...}}
+with rerun.phase("load_user_data"):
+    user_data = load_user_data(user)  # {"events":[...], "prefs": {...}}
 
 # ensure structure
 if "events" not in user_data:
@@ -158,7 +233,24 @@ if "color_event" not in user_data["prefs"]:
 if "calendar_view" not in user_data["prefs"]:
     user_data["prefs"]["calendar_view"] = "Mensual"
 
+# índice por fecha: se arma una vez por carga y se mantiene en add/edit/delete
+event_index = EventIndex(user_data["events"])
+rerun.tag(events=len(user_data["events"]))
+
+# avisos que el planificador dejó para este usuario desde la última rerun
+if scheduler is not None and isinstance(scheduler.sink, InboxSink):
+    for r in scheduler.sink.pop(user):
+        e = r["event"]
+        st.toast(f"🔔 {e.get('title')} — {r['date']} {e.get('time') or ''}")
+
 # ---------------- Survey (encuesta previa) ----------------
+# cada envío queda en surveys.db con su tendencia (promedio móvil, pendiente, racha) ya actualizada;
+# la sesión lee solo esa fila al entrar, así la alerta no se pierde al cerrar sesión
+survey_store = get_survey_store()
+if "survey_trend" not in st.session_state:
+    st.session_state.survey_trend = survey_store.trend(user)
+    st.session_state.risk_detected = bool(st.session_state.survey_trend.risk_reasons())
+
 def survey_block():
     st.subheader("💭 Encuesta breve de bienestar")
     energia = st.slider("Nivel de energía (0-10)", 0, 10, 5, key="s_energia")
@@ -168,33 +260,28 @@ def survey_block():
     if st.button("Enviar encuesta"):
         prom = (energia + animo + concentracion + motivacion)/4
         st.session_state.survey_done = True
-        # Keep summary in session for suggestions later
-        st.session_state.survey_summary = {"energia":energia,"animo":animo,"conc":concentracion,"motiv":motivacion,"prom":prom}
-        
+        summary = {"energia":energia,"animo":animo,"conc":concentracion,"motiv":motivacion,"prom":prom}
+        trend = survey_store.add(user, summary)
+        st.session_state.survey_trend = trend
+        # Keep summary (y la tendencia) in session for suggestions later
+        summary.update(avg=trend.average, slope=trend.slope, streak=trend.streak)
+        st.session_state.survey_summary = summary
+
         # --- MODIFICACIÓN: Detectar riesgo automáticamente ---
-        # Si el promedio es bajo (< 4), activamos la alerta
-        if prom < 4.0:
-            st.session_state.risk_detected = True
-        else:
-            st.session_state.risk_detected = False
-            
+        # promedio bajo (< 4), varias encuestas bajas seguidas o una caída sostenida activan la alerta
+        st.session_state.risk_detected = bool(trend.risk_reasons())
+
+
         st.success("Gracias. ANIMA usará esto para sugerir una planificación equilibrada.")
         st.rerun()
     st.stop()
 
-# If not done survey, show it on first visit to calendar or chat
-if not st.session_state.survey_done:
-    survey_block()
-
-# --- MODIFICACIÓN: MOSTRAR ALERTA AUTOMÁTICA SI HAY RIESGO ---
-# Esto aparece en CUALQUIER pantalla si la encuesta fue negativa
-if st.session_state.get("risk_detected", False):
-    st.error("⚠️ ANIMA ha detectado que tus niveles de energía o ánimo están bajos.")
-    st.markdown("""
+def support_banner():
+    st.markdown(f"""
     <div style="background-color: #f8d7da; padding: 15px; border-radius: 10px; border: 1px solid #f5c6cb; color: #721c24; margin-bottom: 20px;">
         <h3 style="margin-top:0; color: #721c24;">🆘 Apoyo Profesional UDD</h3>
         <p>No tienes que pasar por esto solo/a. El equipo de bienestar está disponible para escucharte.</p>
-        <a href="https://wa.me/569XXXXXXXX" target="_blank" style="text-decoration: none;">
+        <a href="{assistant.SUPPORT_LINK}" target="_blank" style="text-decoration: none;">
             <button style="background-color: #25D366; color: white; border: none; padding: 10px 20px; border-radius: 5px; font-weight: bold; font-size: 16px; cursor: pointer;">
                 💬 Contactar por WhatsApp ahora
             </button>
@@ -202,113 +289,148 @@ if st.session_state.get("risk_detected", False):
     </div>
     """, unsafe_allow_html=True)
 
-# ---------------- Helpers for calendar ----------------
-def parse_date(d):
-    if isinstance(d, str):
-        return datetime.fromisoformat(d).date()
-    if isinstance(d, date):
-        return d
-    return None
-
-def events_on_day(events, d):
-    dstr = str(d)
-    return [e for e in events if e.get("date")==dstr]
-
-def upcoming_events(events, days=3):
-    today = date.today()
-    out = []
-    for e in events:
-        ed = parse_date(e.get("date"))
-        if ed is None:
-            continue
-        delta = (ed - today).days
-        if 0 <= delta <= days:
-            out.append((delta,e))
-    out.sort(key=lambda x: x[0])
-    return out
+# --- MODIFICACIÓN: MOSTRAR ALERTA AUTOMÁTICA SI HAY RIESGO ---
+# Esto aparece en CUALQUIER pantalla si la encuesta fue negativa
+if st.session_state.get("risk_detected", False):
+    st.error("⚠️ ANIMA ha detectado que tus niveles de energía o ánimo están bajos.")
+    reasons = st.session_state.survey_trend.risk_reasons()
+    if reasons:
+        st.caption("Según tus encuestas: " + "; ".join(reasons) + ".")
+    support_banner()
 
-def month_matrix(year, month):
-    cal = calendar.Calendar(firstweekday=0)  # Monday=0? here Sunday=6; but we'll use default
-    weeks = cal.monthdayscalendar(year, month)
-    return weeks
+# If not done survey, show it on first visit to calendar or chat
+if not st.session_state.survey_done:
+    with rerun.phase("survey_block"):
+        survey_block()
+
+# ---------------- Wellbeing trend ----------------
+def render_trend(trend, limit=30):
+    if trend.count < 2:
+        return
+    # el gráfico solo se rearma cuando llega una encuesta nueva (trend.count cambia)
+    cached = st.session_state.get("trend_frame")
+    if cached is None or cached[0] != trend.count:
+        df = pd.DataFrame(survey_store.recent(user, limit)).set_index("created")
+        df = df[["prom"]].rename(columns={"prom": "Promedio"})
+        df["Promedio móvil"] = df["Promedio"].rolling(WINDOW, min_periods=1).mean()
+        cached = st.session_state.trend_frame = (trend.count, df)
+    with st.expander("📈 Tu bienestar en las últimas encuestas"):
+        st.line_chart(cached[1])
+        st.caption(f"Promedio móvil: {trend.average:.1f} · tendencia: {trend.slope:+.2f} por encuesta · encuestas bajas seguidas: {trend.streak}")
+
+# ---------------- Chat pane (fragmento) ----------------
+@fragment
+def chat_pane():
+    # enviar un mensaje reejecuta solo este panel: el anillo de turnos, el screening y la respuesta
+    with pane_metrics("Chat de ayuda") as run:
+        history = st.container()
+        user_msg = st.chat_input("Escribe aquí tu mensaje...")
+        with history:
+            # show chat history (solo el anillo de turnos recientes; lo anterior está en "Historial")
+            for m in chat_turns():
+                with st.chat_message("user"):
+                    st.write(m["user"])
+                with st.chat_message("assistant"):
+                    if m.get("risk"):
+                        support_banner()
+                    st.write(m["bot"])
+            if user_msg:
+                received = time.perf_counter()
+                with st.chat_message("user"):
+                    st.write(user_msg)
+                # screening local antes del modelo: el enlace de apoyo aparece al instante, aunque Groq tarde o falle
+                with run.phase("risk_screen"):
+                    risk = get_matcher().match(user_msg)
+                with st.chat_message("assistant"), run.phase("ai_reply"):
+                    if risk:
+                        support_banner()
+                    if STREAM_REPLIES:
+                        # la respuesta se va pintando token a token; al final queda completa en stream.text
+                        stream = ai_reply_stream(user_msg, started=received)
+                        st.write_stream(stream)
+                        record_turn(user, {"user":user_msg, "bot":stream.text, "ttft":stream.metrics["ttft"], "total":stream.metrics["total"],
+                                           "cached":stream.metrics["cached"], "prompt_tokens":chat_context().last_prompt_tokens, "risk":risk and risk[0]})
+                    else:
+                        reply = ai_reply(user_msg)
+                        st.write(reply)
+                        record_turn(user, {"user":user_msg, "bot":reply, "prompt_tokens":chat_context().last_prompt_tokens, "risk":risk and risk[0]})
 
 # ---------------- Calendar UI render (monthly grid) ----------------
-def render_month_view(events, year, month, prefs):
-    # Build mapping of date -> list events
-    events_map = {}
-    for e in events:
-        ed = e.get("date")
-        if ed:
-            events_map.setdefault(ed, []).append(e)
-
-    weeks = month_matrix(year, month)
-    month_name = calendar.month_name[month]
-    html = f"<div style='width:100%'><h3 style='margin-bottom:6px'>{month_name} {year}</h3>"
-    html += "<table style='width:100%; border-collapse:collapse;'>"
-    # header weekdays
-    html += "<tr>"
-    for wd in ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]:
-        html += f"<th style='text-align:left;padding:8px;color:#2B2B2B'>{wd}</th>"
-    html += "</tr>"
-    # weeks
-    for wk in weeks:
-        html += "<tr>"
-        for day in wk:
-            if day == 0:
-                html += "<td class='calendar-cell' style='height:90px;background:transparent'></td>"
-            else:
-                ddate = date(year, month, day)
-                key = str(ddate)
-                pills_html = ""
-                if key in events_map:
-                    # show up to 2 event pills
-                    for ev in events_map[key][:2]:
-                        title_short = ev.get("title","").replace("<","").replace(">","")
-                        color = ev.get("color", prefs.get("color_event","#AED9E0"))
-                        pills_html += f"<div class='event-pill' style='background:{color};color:#222;margin-top:4px;'>{title_short[:18]}</div>"
-                    if len(events_map[key])>2:
-                        pills_html += f"<div style='font-size:12px;color:#6b6b6b;margin-top:4px;'>+{len(events_map[key])-2} more</div>"
-                html += f"<td class='calendar-cell' style='vertical-align:top; padding:8px; height:90px;'>"
-                html += f"<div class='calendar-day-num'>{day}</div>{pills_html}</td>"
-        html += "</tr>"
-    html += "</table></div>"
+def render_month_view(index, year, month, prefs, version):
+    # la grilla se reutiliza mientras no cambie el store (versión) ni el color; ver month_grid.py
+    html = cached_month_html(user, index, year, month, version, prefs.get("color_event","#AED9E0"))
     st.markdown(html, unsafe_allow_html=True)
 
-# ---------------- Smart recommendations ----------------
-def smart_recommendations(events, survey):
-    recs = []
-    today = date.today()
-    # upcoming 3 days
-    up = upcoming_events(events, days=3)
-    if up:
-        for delta, e in up:
-            d = parse_date(e["date"])
-            when = "hoy" if delta==0 else f"en {delta} día(s)"
-            recs.append(f"🔔 {when}: {e['title']}. {('Hora: ' + e.get('time')) if e.get('time') else ''}")
-    # overloaded days
-    # compute counts per day for coming week
-    counts = {}
-    for e in events:
-        ed = parse_date(e.get("date"))
-        if ed:
-            if 0 <= (ed - today).days <= 7:
-                counts.setdefault(str(ed),0)
-                counts[str(ed)] += 1
-    overloaded = [d for d,c in counts.items() if c >= 3]
-    if overloaded:
-        recs.append("⚠️ Noté días muy cargados esta semana. ANIMA sugiere incluir pausas de 10-15 minutos cada 90 minutos de estudio.")
-    # based on survey avg (if present)
-    if survey:
-        prom = survey.get("prom", None)
-        if prom is not None and prom < 4:
-            recs.append("💛 Tu encuesta indica baja energía. ANIMA recomienda planificar bloques más cortos de estudio y más descansos.")
-    # suggestions based on keywords
-    keywords = ["prueba","certamen","examen","entrega","control"]
-    if any(any(k in e.get("title","").lower() for k in keywords) for e in events):
-        recs.append("🧠 Tienes evaluaciones próximas: intenta programar repasos cortos y sueño reparador la noche anterior.")
-    return recs
+@fragment
+def month_grid(index, prefs, version):
+    # cambiar de mes reejecuta solo la grilla (con el índice, prefs y versión de la última rerun completa)
+    if "cal_year" not in st.session_state:
+        st.session_state.cal_year = date.today().year
+    if "cal_month" not in st.session_state:
+        st.session_state.cal_month = date.today().month
+
+    with pane_metrics("Calendario ANIMA", events=len(index)) as run:
+        nav1, nav2, nav3 = st.columns([1,2,1])
+        with nav1:
+            if st.button("◀️ Mes anterior"):
+                y, m = shift_month(st.session_state.cal_year, st.session_state.cal_month, -1)
+                st.session_state.cal_month = m; st.session_state.cal_year = y
+        with nav2:
+            st.markdown(f"### {calendar.month_name[st.session_state.cal_month]} {st.session_state.cal_year}")
+        with nav3:
+            if st.button("Mes siguiente ▶️"):
+                y, m = shift_month(st.session_state.cal_year, st.session_state.cal_month, 1)
+                st.session_state.cal_month = m; st.session_state.cal_year = y
+
+        with run.phase("render_month_view"):
+            render_month_view(index, st.session_state.cal_year, st.session_state.cal_month, prefs, version)
+
+def render_workload(workload):
+    # mapa de calor semana x día (6 semanas) + resumen por categoría, todo desde el frame ya agregado
+    heat = workload.heatmap()
+    chart = alt.Chart(heat).mark_rect(stroke="white").encode(
+        x=alt.X("dia:O", sort=WEEKDAY_NAMES, title=None),
+        y=alt.Y("semana:O", title="Semana del"),
+        color=alt.Color("eventos:Q", scale=alt.Scale(scheme="blues"), title="Eventos"),
+        tooltip=["fecha:T", "eventos:Q"],
+    )
+    st.altair_chart(chart, width="stretch")
+    cats = workload.by_category
+    st.caption(f"Próximas 6 semanas: {cats['evaluacion']} evaluación(es) · {cats['clase']} clase(s) · {cats['otro']} otro(s)")
+    monday, busy = workload.busiest_week()
+    if busy:
+        st.caption(f"Semana más cargada: la del {monday.strftime('%d/%m')} ({busy} eventos)")
 
 # ---------------- Calendar Editor UI ----------------
+EVENTS_PER_PAGE = 10
+
+def import_export(user_data, prefs):
+    # importación en streaming: se valida y guarda por lotes, sin una rerun por evento
+    upload = st.file_uploader("Archivo del horario (.ics o .csv)", type=["ics", "csv"], key="evt_import")
+    if upload is not None and st.button("Importar eventos"):
+        records = iter_ics(open_text(upload)) if upload.name.lower().endswith(".ics") else iter_csv(open_text(upload))
+        with st.spinner("Importando..."):
+            res = import_events(records, store, user, user_data, index=event_index, default_color=prefs.get("color_event","#AED9E0"))
+        st.success(f"{res['added']} evento(s) importado(s) · {res['duplicates']} duplicado(s) omitido(s) · {res['invalid']} inválido(s).")
+        for err in res["errors"]:
+            st.caption(err)
+    # la exportación se genera recién al hacer clic (callable), no en cada rerun
+    e1, e2 = st.columns(2)
+    with e1:
+        st.download_button("Exportar .ics", data=lambda: export_file(user_data["events"], write_ics),
+                           file_name=f"anima_{user}.ics", mime="text/calendar", on_click="ignore")
+    with e2:
+        st.download_button("Exportar .csv", data=lambda: export_file(user_data["events"], write_csv),
+                           file_name=f"anima_{user}.csv", mime="text/csv", on_click="ignore")
+
+def export_file(events, writer):
+    out = io.BytesIO()
+    text = io.TextIOWrapper(out, encoding="utf-8", newline="")
+    writer(list(events), text)
+    text.flush()
+    text.detach()
+    return out
+
 def calendar_editor(user_data):
     st.subheader("Configuración y eventos")
     prefs = user_data.get("prefs", {})
@@ -325,6 +447,15 @@ def calendar_editor(user_data):
     with c2:
         ev_time = st.text_input("Hora (opcional, ej. 14:30)", key="evt_time")
         desc = st.text_area("Descripción (opcional)", key="evt_desc")
+    # repetición: la serie se guarda una sola vez y se expande solo para la ventana que se muestra
+    r1, r2, r3 = st.columns(3)
+    with r1:
+        repeat = st.selectbox("Repetir", ["No se repite", "Cada día", "Cada semana"], key="evt_repeat")
+    with r2:
+        rep_days = st.multiselect("Días", WEEKDAY_NAMES, default=[WEEKDAY_NAMES[ev_date.weekday()]], key="evt_days",
+                                  disabled=repeat != "Cada semana")
+    with r3:
+        rep_until = st.date_input("Hasta (opcional)", value=None, key="evt_until", disabled=repeat == "No se repite")
 
     add_clicked = st.button("Agregar evento")
     if add_clicked:
@@ -332,42 +463,140 @@ def calendar_editor(user_data):
             st.error("El evento necesita un título.")
         else:
             new = {"title": title.strip(), "date": str(ev_date), "time": ev_time.strip(), "desc": desc.strip(), "color": prefs.get("color_event","#AED9E0")}
-            user_data.setdefault("events", []).append(new)
-            save_user_data(user, user_data)
+            if repeat != "No se repite":
+                new["recurrence"] = {"freq": "daily" if repeat == "Cada día" else "weekly"}
+                if repeat == "Cada semana" and rep_days:
+                    new["recurrence"]["weekdays"] = [WEEKDAY_NAMES.index(d) for d in rep_days]
+                if rep_until:
+                    new["recurrence"]["until"] = str(rep_until)
+            event_index.add(store.add_event(user, user_data, new))
             st.success("Evento agregado correctamente.")
             st.rerun()
 
+    with st.expander("Importar / exportar calendario (ICS o CSV)"):
+        import_export(user_data, prefs)
+
     st.markdown("---")
     st.subheader("Tus eventos (editar / eliminar)")
-    events = user_data.get("events", [])
-    if not events:
+    if not len(event_index):
         st.info("No tienes eventos todavía.")
-    else:
-        # list with delete buttons
-        for idx, e in enumerate(events):
+        return
+    # lista paginada: se filtra con el índice y solo se crean los widgets de la página visible
+    f1, f2 = st.columns([2,1])
+    with f1:
+        query = st.text_input("Buscar por título", key="evt_query")
+    with f2:
+        default_range = (date.today() - timedelta(days=30), date.today() + timedelta(days=90))
+        rango = st.date_input("Rango de fechas", value=default_range, key="evt_range")
+    # rango borrado (Streamlit devuelve ()): se vuelve a la ventana por defecto, no a date.min/date.max
+    start, end = (rango[0], rango[-1]) if isinstance(rango, (tuple, list)) and rango else default_range
+    matches = search_events(event_index, query, start, end)
+
+    # volver a la primera página cuando cambian los filtros
+    filters = (query, start, end)
+    if st.session_state.get("evt_filters") != filters:
+        st.session_state.evt_filters = filters
+        st.session_state.evt_page = 0
+    pages = max(1, -(-len(matches) // EVENTS_PER_PAGE))
+    page = min(st.session_state.get("evt_page", 0), pages - 1)
+    if not matches:
+        st.info("Ningún evento coincide con la búsqueda.")
+        return
+
+    p1, p2, p3 = st.columns([1,2,1])
+    with p1:
+        if st.button("◀️ Anteriores", key="evt_prev", disabled=page == 0):
+            st.session_state.evt_page = page - 1
+            st.rerun()
+    with p2:
+        st.caption(f"Mostrando {page*EVENTS_PER_PAGE + 1}-{min(len(matches), (page+1)*EVENTS_PER_PAGE)} de {len(matches)} · página {page+1}/{pages}")
+    with p3:
+        if st.button("Siguientes ▶️", key="evt_next", disabled=page >= pages - 1):
+            st.session_state.evt_page = page + 1
+            st.rerun()
+
+    # keys por id estable del evento (no por posición en la lista)
+    for d, e in matches[page*EVENTS_PER_PAGE:(page+1)*EVENTS_PER_PAGE]:
+        eid = e["id"]
+        rule = rule_of(e)
+        if rule:
+            st.markdown(f"**{e.get('title')}** — 🔁 {rule.describe()} (desde {e.get('date')}) {(' - ' + e['time']) if e.get('time') else ''}")
+        else:
             st.markdown(f"**{e.get('title')}** — {e.get('date')} {(' - ' + e['time']) if e.get('time') else ''}")
-            st.write(e.get("desc",""))
-            col1, col2 = st.columns([0.1,0.9])
-            with col1:
-                if st.button("Eliminar", key=f"del_{idx}"):
-                    events.pop(idx)
-                    user_data["events"] = events
-                    save_user_data(user, user_data)
-                    st.success("Evento eliminado.")
-                    st.experimental_rerun()
-            with col2:
-                if st.button("Editar", key=f"edit_{idx}"):
-                    # bring up edit form
-                    new_title = st.text_input("Nuevo título", value=e.get("title"), key=f"nt_{idx}")
-                    new_date = st.date_input("Nueva fecha", value=parse_date(e.get("date")), key=f"nd_{idx}")
-                    new_time = st.text_input("Nueva hora", value=e.get("time",""), key=f"ntm_{idx}")
-                    new_desc = st.text_area("Nueva descripción", value=e.get("desc",""), key=f"ndesc_{idx}")
-                    if st.button("Guardar cambios", key=f"save_{idx}"):
-                        events[idx] = {"title": new_title, "date": str(new_date), "time": new_time, "desc": new_desc, "color": e.get("color", prefs.get("color_event"))}
-                        user_data["events"] = events
-                        save_user_data(user, user_data)
-                        st.success("Cambios guardados.")
-                        st.experimental_rerun()
+        st.write(e.get("desc",""))
+        col1, col2 = st.columns([0.1,0.9])
+        with col1:
+            if st.button("Eliminar", key=f"del_{eid}"):
+                store.delete_event(user, user_data, eid)
+                event_index.remove(eid)
+                st.success("Evento eliminado.")
+                st.rerun()
+        with col2:
+            if st.button("Editar", key=f"edit_{eid}"):
+                st.session_state.evt_editing = eid
+        if st.session_state.get("evt_editing") == eid:
+            # bring up edit form
+            new_title = st.text_input("Nuevo título", value=e.get("title"), key=f"nt_{eid}")
+            new_date = st.date_input("Nueva fecha", value=parse_date(e.get("date")), key=f"nd_{eid}")
+            new_time = st.text_input("Nueva hora", value=e.get("time",""), key=f"ntm_{eid}")
+            new_desc = st.text_area("Nueva descripción", value=e.get("desc",""), key=f"ndesc_{eid}")
+            s1, s2 = st.columns([0.2,0.8])
+            with s1:
+                if st.button("Guardar cambios", key=f"save_{eid}"):
+                    updated = store.update_event(user, user_data, eid, {"title": new_title, "date": str(new_date), "time": new_time, "desc": new_desc, "color": e.get("color", prefs.get("color_event"))})
+                    event_index.update(updated)
+                    st.session_state.evt_editing = None
+                    st.success("Cambios guardados.")
+                    st.rerun()
+            with s2:
+                if st.button("Cancelar", key=f"cancel_{eid}"):
+                    st.session_state.evt_editing = None
+                    st.rerun()
+            if rule:
+                # excepción: quita una sola fecha de la serie
+                skip = st.date_input("Omitir una fecha de la serie", value=d, key=f"skip_{eid}")
+                if st.button("Omitir fecha", key=f"skipbtn_{eid}"):
+                    recurrence = dict(e["recurrence"])
+                    recurrence["except"] = sorted(set(recurrence.get("except", [])) | {str(skip)})
+                    event_index.update(store.update_event(user, user_data, eid, {"recurrence": recurrence}))
+                    st.success(f"{skip} omitida de la serie.")
+                    st.rerun()
+
+# ---------------- Foros (fragmento) ----------------
+# ANIMA_FORUM_POLL=<segundos> trae los posts nuevos de otros estudiantes sin clics (0 = solo al interactuar)
+FORUM_POLL = float(os.getenv("ANIMA_FORUM_POLL", "0")) or None
+
+@fragment(run_every=FORUM_POLL)
+def forum_pane():
+    # foros compartidos entre todos los estudiantes (forums.db); la sesión guarda solo una ventana acotada
+    with pane_metrics("Grupos de apoyo") as run, run.phase("forum"):
+        forum = get_forum_store()
+        if "forum_views" not in st.session_state:
+            st.session_state.forum_views = {}
+        group = st.selectbox("Selecciona grupo", GROUPS)
+        view = st.session_state.forum_views.setdefault(group, ForumView())
+        view.refresh(forum, group)
+        st.markdown(f"### Foro: {group}")
+        if view.has_older(forum, group):
+            if st.button("Ver comentarios anteriores"):
+                view.load_older(forum, group)
+                rerun_pane()
+        if not view.live:
+            if st.button("Volver a lo más reciente"):
+                view.back_to_latest()
+                rerun_pane()
+        today = str(date.today())
+        for msg in view.posts:
+            when = msg["created"][11:16] if msg["created"].startswith(today) else f"{msg['created'][8:10]}/{msg['created'][5:7]} {msg['created'][11:16]}"
+            st.markdown(f"**{msg['author']} ({when}):** {msg['text']}")
+        new_msg = st.text_area("Escribe un comentario")
+        if st.button("Publicar comentario"):
+            if new_msg.strip():
+                # FORO ANONIMO
+                forum.post(group, new_msg.strip())
+                view.back_to_latest()
+                st.success("Publicado.")
+                rerun_pane()
 
 # ---------------- MAIN VIEWS ----------------
 # Sidebar fallback (when menu_open False)
@@ -379,6 +608,7 @@ if not st.session_state.menu_open:
         st.session_state.menu_choice = choice
 
 choice = st.session_state.get("menu_choice","Chat de ayuda")
+rerun.tag(view=choice)
 
 if choice == "Cerrar sesión":
     st.session_state.clear()
@@ -390,107 +620,94 @@ if choice == "Chat de ayuda":
     st.title("💬 Chat de apoyo emocional ANIMA")
     st.write(f"Hola {user}, soy ANIMA. ¿Cómo te sientes hoy?")
     # quick suggestions from calendar when entering chat
-    recs = smart_recommendations(user_data.get("events",[]), st.session_state.get("survey_summary", None))
+    with rerun.phase("smart_recommendations"):
+        workload = cached_workload(user, event_index, user_data.get("version", 0))
+        recs = smart_recommendations(event_index, st.session_state.get("survey_summary", None), workload=workload,
+                                     upcoming=user_reminders(user, event_index))
     if recs:
         st.markdown("### Recomendaciones rápidas de ANIMA")
         for r in recs[:5]:
             st.info(r)
-    # chat input (simple)
-    user_msg = st.chat_input("Escribe aquí tu mensaje...")
-    if user_msg:
-        reply = ai_reply(user_msg)
-        # keep minimal chat history in session
-        if "chat_hist" not in st.session_state:
-            st.session_state.chat_hist = []
-        st.session_state.chat_hist.append({"user":user_msg, "bot":reply})
-    # show chat history
-    if "chat_hist" in st.session_state:
-        for m in st.session_state.chat_hist:
-            with st.chat_message("user"):
-                st.write(m["user"])
-            with st.chat_message("assistant"):
-                st.write(m["bot"])
+    render_trend(st.session_state.survey_trend)
+    chat_pane()
 
 # Calendar view
 elif choice == "Calendario ANIMA":
     st.title("🗓️ Calendario ANIMA")
     # top: quick reminders
-    reminders = upcoming_events(user_data.get("events",[]), days=3)
+    reminders = user_reminders(user, event_index)
     if reminders:
         st.subheader("🔔 Recordatorios próximos")
         for delta, e in reminders:
             when = "Hoy" if delta==0 else f"En {delta} día(s)"
-            st.info(f"{when}: {e.get('title')} — {e.get('date')} {('(' + e.get('time') + ')') if e.get('time') else ''}")
+            # en una serie e["date"] es la primera fecha: se muestra la de esta ocurrencia
+            st.info(f"{when}: {e.get('title')} — {date.today() + timedelta(days=delta)} {('(' + e.get('time') + ')') if e.get('time') else ''}")
 
     st.markdown("---")
     # settings and editor
-    calendar_editor(user_data)
+    with rerun.phase("calendar_editor"):
+        calendar_editor(user_data)
+    if getattr(user_data, "rebased", False):
+        # otra pestaña (u otro servidor) guardó en paralelo: el guardado mezcló sus cambios, se rearma el índice
+        event_index = EventIndex(user_data["events"])
 
     st.markdown("---")
     # monthly grid
     st.subheader("Vista mensual")
-    # navigation
-    if "cal_year" not in st.session_state:
-        st.session_state.cal_year = date.today().year
-    if "cal_month" not in st.session_state:
-        st.session_state.cal_month = date.today().month
+    month_grid(event_index, user_data.get("prefs",{}), user_data.get("version", 0))
 
-    nav1, nav2, nav3 = st.columns([1,2,1])
-    with nav1:
-        if st.button("◀️ Mes anterior"):
-            m = st.session_state.cal_month - 1
-            y = st.session_state.cal_year
-            if m < 1:
-                m = 12; y -= 1
-            st.session_state.cal_month = m; st.session_state.cal_year = y
-    with nav2:
-        st.markdown(f"### {calendar.month_name[st.session_state.cal_month]} {st.session_state.cal_year}")
-    with nav3:
-        if st.button("Mes siguiente ▶️"):
-            m = st.session_state.cal_month + 1
-            y = st.session_state.cal_year
-            if m > 12:
-                m = 1; y += 1
-            st.session_state.cal_month = m; st.session_state.cal_year = y
-
-    render_month_view(user_data.get("events",[]), st.session_state.cal_year, st.session_state.cal_month, user_data.get("prefs",{}))
+    st.subheader("Carga de las próximas semanas")
+    with rerun.phase("workload_heatmap"):
+        render_workload(cached_workload(user, event_index, user_data.get("version", 0)))
 
     st.markdown("---")
     st.caption("WebApp ANIMA - Apoyo Emocional UDD 💙 Desarrollado con Streamlit + Groq")
 
-# Foros view (simple area)
+# Foros view (shared, paginated)
 elif choice == "Grupos de apoyo":
     st.title("🤝 Grupos de apoyo UDD (Anónimo)")
-    # simple local forum (session-based)
-    if "forums" not in st.session_state:
-        st.session_state.forums = {"Bienestar y salud mental": [], "Apoyo entre compañeros": [], "Motivación y energía": []}
-    group = st.selectbox("Selecciona grupo", list(st.session_state.forums.keys()))
-    st.markdown(f"### Foro: {group}")
-    for msg in st.session_state.forums[group]:
-        st.markdown(f"**Anónimo ({msg['time']}):** {msg['text']}")
-    new_msg = st.text_area("Escribe un comentario")
-    if st.button("Publicar comentario"):
-        if new_msg.strip():
-            # FORO ANONIMO
-            st.session_state.forums[group].append({"author":"Anónimo","time":datetime.now().strftime("%H:%M"),"text":new_msg.strip()})
-            st.success("Publicado.")
-            st.rerun()
+    forum_pane()
 
 
 # Historial view
 elif choice == "Historial":
     st.title("🕒 Historial de conversaciones")
-    hist = st.session_state.get("historial", [])
+    # una página por rerun desde el chatlog (el cursor es el número de turno); nada queda cargado en sesión
+    chat_log = get_chat_log()
+    with rerun.phase("chat_history"):
+        total = chat_log.count(user)
+        hist = chat_log.page(user, before=st.session_state.get("hist_before"), limit=HISTORY_PER_PAGE)
     if not hist:
         st.info("Aún no hay historial.")
     else:
+        first, last = hist[0]["n"], hist[-1]["n"]
+        h1, h2, h3 = st.columns([1,2,1])
+        with h1:
+            if st.button("◀️ Anteriores", key="hist_prev", disabled=first == 0):
+                st.session_state.hist_before = first
+                st.rerun()
+        with h2:
+            st.caption(f"Mostrando {first + 1}-{last + 1} de {total}")
+        with h3:
+            if st.button("Más recientes ▶️", key="hist_next", disabled=last + 1 >= total):
+                newer = last + 1 + HISTORY_PER_PAGE
+                st.session_state.hist_before = None if newer >= total else newer
+                st.rerun()
+        session = None
         for h in hist:
+            if h.get("session") != session:
+                session = h.get("session")
+                st.subheader(f"Conversación del {h.get('ts', '')[:16].replace('T', ' ')}")
             st.markdown(f"**Tú:** {h.get('user')}")
+            if h.get("risk"):
+                support_banner()
             st.markdown(f"**ANIMA:** {h.get('bot')}")
             st.markdown("---")
 
 # save any changes to user_data at end
-save_user_data(user, user_data)
+with rerun.phase("save_user_data"):
+    save_user_data(user, user_data)
+rerun.finish()
 
 
 
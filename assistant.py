@@ -0,0 +1,117 @@
+# assistant.py - Respuestas de ANIMA vía llm_gateway (bloqueante o en streaming con métricas)
+import time
+from reply_cache import cache_key
+from screening import get_matcher
+
+MODEL = "llama-3.3-70b-versatile"
+
+SUPPORT_LINK = "https://wa.me/569XXXXXXXX"
+
+# Instrucción de sistema con enlace a WhatsApp en caso de riesgo
+SYSTEM_INSTRUCTION = (
+    "Eres ANIMA, un asistente empático de la UDD que ayuda a planificar y cuidar el bienestar. "
+    "Si detectas que el usuario expresa angustia severa, pensamientos de riesgo o solicita ayuda profesional explícita, "
+    "DEBES finalizar tu respuesta sugiriendo contactar a los especialistas y proporcionar este enlace de WhatsApp: "
+    f"{SUPPORT_LINK} (Indícalo amablemente)."
+)
+
+OFFLINE_REPLY = "ANIMA no puede conectarse al servicio de IA en este momento. Igual puedo ayudarte con tu calendario."
+
+# Criterios de riesgo de la instrucción de sistema (angustia severa, riesgo, pedir ayuda profesional):
+# léxico compartido de screening.py. Estos mensajes nunca se responden desde la caché.
+def looks_risky(prompt):
+    return get_matcher().is_risky(prompt)
+
+def _cache_lookup(cache, prompt, messages):
+    """(clave, respuesta en caché). Clave None = no se cachea (sin caché, con historial o mensaje de riesgo)."""
+    # con turnos previos la respuesta depende de la conversación: solo se cachean mensajes sueltos
+    if cache is None or len(messages) > 2:
+        return None, None
+    if looks_risky(prompt):
+        cache.note_bypass()
+        return None, None
+    key = cache_key(prompt, SYSTEM_INSTRUCTION, MODEL)
+    return key, cache.get(key)
+
+
+def error_reply(e):
+    return f"ANIMA no pudo generar respuesta automática ({e})."
+
+def system_messages():
+    return [{"role":"system", "content": SYSTEM_INSTRUCTION}]
+
+def build_messages(prompt):
+    return system_messages() + [{"role":"user", "content": prompt}]
+
+
+def ai_reply(gateway, prompt, cache=None, messages=None):
+    """Llamada segura a Groq (vía llm_gateway); si falla, devuelve texto por defecto.
+
+    `messages` (ver context.ConversationContext) reemplaza al par sistema + prompt.
+    """
+    if gateway.client is None:
+        return OFFLINE_REPLY
+    messages = messages or build_messages(prompt)
+    key, hit = _cache_lookup(cache, prompt, messages)
+    if hit is not None:
+        return hit
+    try:
+        reply = gateway.complete(messages, model=MODEL)
+    except Exception as e:
+        return error_reply(e)
+    # si el modelo igual derivó a especialistas, la respuesta no se reutiliza
+    if key is not None and reply and SUPPORT_LINK not in reply:
+        cache.put(key, reply)
+    return reply
+
+
+class ReplyStream:
+    """Iterable de fragmentos de texto de la respuesta (sirve directo para st.write_stream).
+
+    Al agotarse deja en .text la respuesta completa y en .metrics el tiempo al primer token
+    (ttft) y el tiempo total de generación, en segundos, medidos desde `started` (la llegada del mensaje,
+    así entra lo que se hizo antes de pedir la respuesta) o desde que se empieza a iterar. Con `cache`, un hit
+    se entrega de una vez.
+    """
+
+    def __init__(self, gateway, prompt, cache=None, messages=None, clock=time.perf_counter, started=None):
+        self.gateway = gateway
+        self.prompt = prompt
+        self.cache = cache
+        self.messages = messages or build_messages(prompt)
+        self.clock = clock
+        self.started = started
+        self.text = ""
+        self._parts = []
+        self.metrics = {"ttft": None, "total": None, "chunks": 0, "cached": False}
+
+    def _chunks(self):
+        if self.gateway.client is None:
+            yield OFFLINE_REPLY
+            return
+        key, hit = _cache_lookup(self.cache, self.prompt, self.messages)
+        if hit is not None:
+            self.metrics["cached"] = True
+            yield hit
+            return
+        try:
+            yield from self.gateway.stream(self.messages, model=MODEL)
+        except Exception as e:
+            yield ("\n\n" if self._parts else "") + error_reply(e)
+            return
+        text = "".join(self._parts)
+        if key is not None and text and SUPPORT_LINK not in text:
+            self.cache.put(key, text)
+
+    def __iter__(self):
+        start = self.started if self.started is not None else self.clock()
+        try:
+            for piece in self._chunks():
+                if self.metrics["ttft"] is None:
+                    self.metrics["ttft"] = self.clock() - start
+                self.metrics["chunks"] += 1
+                self._parts.append(piece)
+                yield piece
+        finally:
+            self.text = "".join(self._parts)
+            self.metrics["total"] = self.clock() - start
@@ -0,0 +1,67 @@
+# bench/chatlog_bench.py - Historial de chat segmentado (chatlog.ChatLog): escrituras concurrentes y páginas
+#
+# Uso:  python bench/chatlog_bench.py --procs 4 --turns 500 --segment 200
+# Varios procesos agregan turnos al mismo usuario (como pestañas o servidores a la vez); al final cada turno
+# tiene que estar una sola vez y los segmentos llenos exactamente. Después mide la latencia de la página más
+# reciente y de una muy vieja, que no debería crecer con el largo del historial. Sale con 1 si algo falla.
+import argparse, os, sys, tempfile, time
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from chatlog import ChatLog
+
+USER = "bench"
+
+
+def writer(workdir, segment, proc, turns):
+    log = ChatLog(workdir, segment_turns=segment)
+    for i in range(turns):
+        log.append(USER, {"user": f"p{proc} #{i}", "bot": "respuesta " * 20, "session": f"p{proc}"})
+
+def page_us(log, before, reps=200):
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        log.page(USER, before=before, limit=20)
+    return (time.perf_counter() - t0) / reps * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Escrituras concurrentes y paginación del chatlog")
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--turns", type=int, default=500)
+    ap.add_argument("--segment", type=int, default=200)
+    args = ap.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="anima_chatlog_")
+    t0 = time.perf_counter()
+    with get_context("spawn").Pool(args.procs) as pool:
+        pool.starmap(writer, [(workdir, args.segment, p, args.turns) for p in range(args.procs)])
+    wall = time.perf_counter() - t0
+
+    log = ChatLog(workdir, segment_turns=args.segment)
+    total = log.count(USER)
+    seen, before = [], None
+    while True:
+        page = log.page(USER, before=before, limit=50)
+        if not page:
+            break
+        seen.extend(t["user"] for t in reversed(page))
+        before = page[0]["n"]
+    expected = {f"p{p} #{i}" for p in range(args.procs) for i in range(args.turns)}
+    segs = sorted(os.listdir(os.path.join(workdir, USER)))
+    full = [s for s in segs[:-1] if s.endswith(".jsonl")]
+    sizes_ok = all(sum(1 for _ in open(os.path.join(workdir, USER, s))) == args.segment for s in full)
+    # orden por proceso: cada escritor ve sus turnos en el orden en que los agregó
+    ordered = all([int(u.split("#")[1]) for u in reversed(seen) if u.startswith(f"p{p} ")] == list(range(args.turns))
+                  for p in range(args.procs))
+    ok = total == len(expected) == len(seen) and set(seen) == expected and sizes_ok and ordered
+
+    print(f"turnos={total}/{len(expected)} segmentos={len(full) + 1} escritura={wall:.2f}s ({total / wall:.0f} turnos/s)")
+    print(f"página reciente={page_us(log, None):.0f}us  página más vieja={page_us(log, 20):.0f}us")
+    print(f"sin duplicados ni pérdidas={set(seen) == expected and len(seen) == total} segmentos llenos={sizes_ok} "
+          f"orden={ordered} -> {'OK' if ok else 'ERROR'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
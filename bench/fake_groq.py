@@ -0,0 +1,113 @@
+# bench/fake_groq.py - Servidor local compatible con la API de Groq (OpenAI): fragmentos fijos, latencia y 429
+#
+# Uso:  python bench/fake_groq.py --port 8765
+#       GROQ_BASE_URL=http://127.0.0.1:8765 GROQ_API_KEY=fake streamlit run app.py
+import argparse, json, random, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED = ["Hola, ", "soy ", "ANIMA. ", "Respira ", "profundo: ", "vamos ", "paso ", "a ", "paso."]
+
+
+class FakeGroqHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        cfg = self.server.config
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self.server.requests.append(body)
+        with self.server.lock:
+            self.server.active += 1
+            self.server.peak = max(self.server.peak, self.server.active)
+            limited = self.server.served < cfg["fail_first"] or random.random() < cfg["fail_rate"]
+            self.server.served += 1
+            self.server.rate_limited += limited
+        try:
+            time.sleep(cfg["first_delay"] + random.uniform(0, cfg["jitter"]))
+            if limited:
+                self._rate_limited()
+            else:
+                self._reply(body, cfg)
+        finally:
+            with self.server.lock:
+                self.server.active -= 1
+
+    def _rate_limited(self):
+        payload = json.dumps({"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}}).encode()
+        self.send_response(429)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Retry-After", str(self.server.config["retry_after"]))
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _reply(self, body, cfg):
+        chunks = cfg["chunks"]
+        if not body.get("stream"):
+            text = "".join(chunks)
+            payload = json.dumps({
+                "id": "fake", "object": "chat.completion", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            }).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, piece in enumerate(chunks):
+            if i:
+                time.sleep(cfg["chunk_delay"])
+            self._event({
+                "id": "fake", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            })
+        self._event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _event(self, obj):
+        data = obj if isinstance(obj, str) else json.dumps(obj)
+        raw = f"data: {data}\n\n".encode()
+        self.wfile.write(f"{len(raw):x}\r\n".encode() + raw + b"\r\n")
+        self.wfile.flush()
+
+
+def serve(port=0, chunks=CANNED, first_delay=0.0, chunk_delay=0.0, jitter=0.0,
+          fail_rate=0.0, fail_first=0, retry_after=0):
+    """Levanta el servidor en un hilo; devuelve (server, base_url).
+
+    first_delay/jitter simulan latencia; fail_rate (probabilidad) y fail_first (primeras N) responden 429.
+    server.requests guarda los bodies recibidos y server.peak el máximo de solicitudes simultáneas.
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeGroqHandler)
+    server.daemon_threads = True
+    server.config = {"chunks": list(chunks), "first_delay": first_delay, "chunk_delay": chunk_delay, "jitter": jitter,
+                     "fail_rate": fail_rate, "fail_first": fail_first, "retry_after": retry_after}
+    server.requests = []
+    server.lock = threading.Lock()
+    server.active = server.peak = server.served = server.rate_limited = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+if __name__ == "__main__":
+    ap = argparse.ArgumentParser(description="Endpoint Groq falso con respuestas en streaming")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--first-delay", type=float, default=0.3, help="segundos antes del primer fragmento")
+    ap.add_argument("--chunk-delay", type=float, default=0.05, help="segundos entre fragmentos")
+    ap.add_argument("--jitter", type=float, default=0.0, help="latencia extra aleatoria (s)")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="probabilidad de responder 429")
+    args = ap.parse_args()
+    server, url = serve(args.port, first_delay=args.first_delay, chunk_delay=args.chunk_delay,
+                        jitter=args.jitter, fail_rate=args.fail_rate)
+    print(f"fake Groq escuchando en {url}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
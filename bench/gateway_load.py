@@ -0,0 +1,57 @@
+# bench/gateway_load.py - Carga concurrente sobre llm_gateway contra el stub local (latencia + 429)
+#
+# Uso:  python bench/gateway_load.py --requests 200 --threads 50 --fail-rate 0.2
+import argparse, os, sys, time, threading
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from groq import Groq
+from llm_gateway import LLMGateway
+from fake_groq import serve
+
+PROMPTS = ["estoy estresado por el certamen", "¿cómo organizo mi semana?", "no duermo bien antes de las pruebas"]
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Carga concurrente sobre llm_gateway")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--threads", type=int, default=50)
+    ap.add_argument("--max-inflight", type=int, default=8)
+    ap.add_argument("--rate", type=float, default=50.0)
+    ap.add_argument("--latency", type=float, default=0.05)
+    ap.add_argument("--jitter", type=float, default=0.05)
+    ap.add_argument("--fail-rate", type=float, default=0.2)
+    ap.add_argument("--unique", action="store_true", help="prompts distintos (sin coalescing)")
+    args = ap.parse_args()
+
+    server, url = serve(first_delay=args.latency, jitter=args.jitter, fail_rate=args.fail_rate)
+    gw = LLMGateway(Groq(api_key="fake", base_url=url, max_retries=0), max_inflight=args.max_inflight,
+                    rate=args.rate, burst=args.max_inflight, base_delay=0.05, max_delay=1.0, max_retries=6, timeout=20)
+    lat, errors, lock = [], [], threading.Lock()
+
+    def one(i):
+        prompt = f"mensaje {i}" if args.unique else PROMPTS[i % len(PROMPTS)]
+        t0 = time.perf_counter()
+        try:
+            gw.complete([{"role": "user", "content": prompt}], model="llama-3.3-70b-versatile")
+        except Exception as e:
+            with lock:
+                errors.append(repr(e))
+        with lock:
+            lat.append(time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    with ThreadPoolExecutor(args.threads) as ex:
+        list(ex.map(one, range(args.requests)))
+    wall = time.perf_counter() - t0
+    lat.sort()
+    pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1000
+    print(f"requests={args.requests} wall={wall:.2f}s  p50={pct(.5):.0f}ms p95={pct(.95):.0f}ms p99={pct(.99):.0f}ms")
+    print(f"upstream calls={server.served} 429s={server.rate_limited} peak concurrency={server.peak} (cap {args.max_inflight})")
+    print(f"gateway stats={gw.stats} errors={len(errors)}")
+    server.shutdown()
+    return 1 if server.peak > args.max_inflight else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,125 @@
+# bench/reminder_bench.py - Planificador de recordatorios (reminders.ReminderScheduler) con muchos usuarios
+#
+# Uso:  python bench/reminder_bench.py --users 200 --events 150
+# Carga todos los usuarios una vez, compara upcoming() con events.upcoming_events (mismo resultado, sin
+# recorrer el calendario en cada rerun), aplica ediciones incrementales vía UserStore.subscribe y avanza un
+# reloj falso dos días para verificar que cada aviso sale una sola vez y que, en cada medianoche, la ventana
+# corrida sigue coincidiendo con upcoming_events (eventos que recién entran). Al final reinicia el planificador
+# a las 18:00 y verifica que no avise eventos que ya pasaron ese día. Sale con 1 si algo no coincide.
+import argparse, os, random, sys, tempfile, time
+from datetime import date, datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import SqliteBackend, UserStore
+from events import EventIndex, upcoming_events
+from reminders import MemorySink, ReminderScheduler
+
+TODAY = date(2026, 10, 19)
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def make_events(rnd, n):
+    out = []
+    for i in range(n):
+        e = {"title": f"Evento {i}", "date": str(TODAY + timedelta(days=rnd.randint(-30, 60))),
+             "time": rnd.choice(["", "09:00", "14:30", "18:00"]), "desc": ""}
+        if i % 15 == 0:
+            e["recurrence"] = {"freq": "weekly", "weekdays": [rnd.randint(0, 6)]}
+        out.append(e)
+    return out
+
+def same(sched, store, user, today=TODAY):
+    index = EventIndex(store.load(user)["events"])
+    want = sorted((d, e["id"]) for d, e in upcoming_events(index, days=3, today=today))
+    got = sorted((d, e["id"]) for d, e in sched.upcoming(user, today=today))
+    return want == got
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Planificador de recordatorios con muchos usuarios")
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--events", type=int, default=150)
+    args = ap.parse_args()
+
+    rnd = random.Random(0)
+    workdir = tempfile.mkdtemp(prefix="anima_reminders_")
+    store = UserStore(SqliteBackend(os.path.join(workdir, "bench.db"), legacy_dir=workdir))
+    users = [f"u{i}" for i in range(args.users)]
+    for u in users:
+        store.add_events(u, store.load(u), make_events(rnd, args.events))
+
+    clock = FakeClock(datetime.combine(TODAY, datetime.min.time()))
+    sink = MemorySink()
+    sched = ReminderScheduler(store, sink=sink, clock=clock)
+    store.subscribe(sched.on_commit)
+    t0 = time.perf_counter()
+    sched.load_all()
+    load_ms = (time.perf_counter() - t0) * 1000
+    ok = all(same(sched, store, u) for u in users)
+
+    # por rerun: lista armada del planificador vs índice + upcoming_events
+    u = users[0]
+    index = EventIndex(store.load(u)["events"])
+    reps = 2000
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        upcoming_events(index, days=3, today=TODAY)
+    old_us = (time.perf_counter() - t0) / reps * 1e6
+    t0 = time.perf_counter()
+    for _ in range(reps):
+        sched.upcoming(u, today=TODAY)
+    new_us = (time.perf_counter() - t0) / reps * 1e6
+
+    # cambios incrementales: agregar, mover al rango, borrar
+    data = store.load(u)
+    added = store.add_event(u, data, {"title": "Certamen", "date": str(TODAY + timedelta(days=1)), "time": "10:00", "desc": ""})
+    moved = next(e for e in data["events"] if e["id"] != added["id"] and "recurrence" not in e)
+    store.update_event(u, data, moved["id"], {"date": str(TODAY + timedelta(days=2))})
+    gone = next((e["id"] for d, e in sched.upcoming(u, today=TODAY) if e["id"] not in (added["id"], moved["id"])), None)
+    if gone:
+        store.delete_event(u, data, gone)
+    ok = ok and same(sched, store, u)
+
+    # dos días de reloj falso, de a 15 minutos: cada (usuario, evento, fecha) se avisa una vez; en cada
+    # medianoche la ventana corrida tiene que seguir igual a upcoming_events
+    fire_ms, rolled = 0.0, []
+    while clock.now <= datetime.combine(TODAY + timedelta(days=2), datetime.min.time()):
+        t0 = time.perf_counter()
+        sched.fire_due()
+        fire_ms += (time.perf_counter() - t0) * 1000
+        if clock.now.time() == datetime.min.time() and clock.now.date() != TODAY:
+            rolled.append(all(same(sched, store, v, clock.now.date()) for v in users))
+        clock.now += timedelta(minutes=15)
+    ok = ok and len(rolled) == 2 and all(rolled)
+    keys = [(r["user"], r["event"]["id"], r["date"]) for r in sink.sent]
+    dup = len(keys) - len(set(keys))
+    late = [r for r in sink.sent if r["at"] > datetime.combine(r["date"], datetime.max.time())]
+    ok = ok and not dup and not late and gone not in {k[1] for k in keys if k[0] == u}
+
+    # reinicio a media tarde (redeploy): lo de la mañana ya pasó y no se vuelve a avisar
+    restart = datetime.combine(TODAY + timedelta(days=2), datetime.min.time()) + timedelta(hours=18)
+    sink2 = MemorySink()
+    sched2 = ReminderScheduler(store, sink=sink2, clock=FakeClock(restart))
+    sched2.load_all()
+    sched2.fire_due()
+    past = [r for r in sink2.sent if r["date"] == restart.date() and r["event"].get("time")
+            and r["event"]["time"] < restart.strftime("%H:%M")]
+    ok = ok and not past
+
+    print(f"usuarios={args.users} eventos/usuario={args.events} carga inicial={load_ms:.0f}ms heap={len(sched._heap)}")
+    print(f"upcoming por rerun: upcoming_events={old_us:.1f}us planificador={new_us:.1f}us")
+    print(f"reinicio a las 18:00: avisos={len(sink2.sent)} de eventos ya pasados={len(past)}")
+    print(f"ventana tras cada medianoche igual a upcoming_events={rolled}")
+    print(f"avisos en 2 días={len(sink.sent)} duplicados={dup} tardíos={len(late)} tiempo de envío={fire_ms:.0f}ms -> {'OK' if ok else 'ERROR'}")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
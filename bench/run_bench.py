@@ -0,0 +1,210 @@
+# bench/run_bench.py - Benchmarks reproducibles de los caminos calientes de ANIMA
+#
+#   python bench/run_bench.py                              # corre todo, escribe bench/results.json
+#   python bench/run_bench.py --sizes 100,1000 --quick     # corrida corta
+#   python bench/run_bench.py --baseline bench/baseline.json --tolerance 0.25   # falla si hay regresión
+#
+# Micro-benchmarks (por tamaño de calendario): load/save del store (sqlite y json), upcoming_events,
+# events_on_day, la carga semanal (analytics), smart_recommendations y el HTML del mes (sin y con caché). Además corre reruns completas
+# de app.py con el harness de testing de Streamlit contra el endpoint Groq falso (bench/fake_groq.py),
+# midiendo latencia por rerun y memoria pico (tracemalloc).
+import argparse, json, os, platform, random, statistics, sys, tempfile, time, tracemalloc
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from storage import UserStore, SqliteBackend, JsonBackend
+from events import EventIndex, events_on_day, upcoming_events
+from recommendations import smart_recommendations
+from month_grid import month_html, cached_month_html
+from analytics import workload, cached_workload
+
+TODAY = date(2026, 10, 18)
+TITLES = ["Clase de cálculo", "Certamen 2 álgebra", "Entrega proyecto", "Estudio grupal", "Control de lectura",
+          "Gimnasio", "Ayudantía física", "Examen final", "Reunión de curso", "Prueba de química"]
+
+
+def synthetic_events(n, seed=0, span_days=365):
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        d = TODAY + timedelta(days=rnd.randint(-span_days, span_days))
+        out.append({"id": f"e{i:07d}", "title": rnd.choice(TITLES), "date": str(d),
+                    "time": f"{rnd.randint(8, 20):02d}:{rnd.choice(['00', '30'])}", "desc": "", "color": "#AED9E0"})
+    return out
+
+
+def timeit(fn, repeat, setup=None):
+    samples = []
+    for _ in range(repeat):
+        arg = setup() if setup else None
+        t0 = time.perf_counter()
+        fn(arg) if setup else fn()
+        samples.append(time.perf_counter() - t0)
+    return {"median_s": statistics.median(samples), "min_s": min(samples), "runs": repeat}
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def micro(size, workdir, repeat):
+    res = {}
+    events = synthetic_events(size)
+    for backend in (SqliteBackend(os.path.join(workdir, f"bench_{size}.db"), legacy_dir=workdir), JsonBackend(workdir)):
+        store = UserStore(backend)
+        user = f"bench_{size}"
+        data = store.load(user)
+        data["events"] = [dict(e) for e in events]
+        data["prefs"] = {"color_event": "#AED9E0"}
+        store.save(user, data)
+        res[f"load_user_data[{backend.name}]"] = timeit(lambda: store.load(user), repeat)
+        res[f"save_user_data_clean[{backend.name}]"] = timeit(lambda d: store.save(user, d), repeat, setup=lambda: store.load(user))
+
+        def touch_one():
+            d = store.load(user)
+            d["events"][0]["desc"] = str(time.perf_counter())
+            d.touch(d["events"][0]["id"])
+            return d
+        res[f"save_user_data_one_change[{backend.name}]"] = timeit(lambda d: store.save(user, d), repeat, setup=touch_one)
+        res[f"load_user_data[{backend.name}]"]["peak_bytes"] = peak_memory(lambda: store.load(user))
+
+    index = EventIndex(events)
+    res["index_build"] = timeit(lambda: EventIndex(events), repeat)
+    res["upcoming_events"] = timeit(lambda: upcoming_events(index, days=3, today=TODAY), repeat * 10)
+    res["events_on_day"] = timeit(lambda: events_on_day(index, TODAY), repeat * 10)
+    res["workload_build"] = timeit(lambda: workload(index, TODAY), repeat)
+    res["smart_recommendations"] = timeit(lambda: smart_recommendations(index, {"prom": 3.5}, today=TODAY), repeat * 10)
+    load = cached_workload(f"bench_{size}", index, 1, TODAY)
+    res["smart_recommendations[cached_workload]"] = timeit(
+        lambda: smart_recommendations(index, {"prom": 3.5}, today=TODAY, workload=cached_workload(f"bench_{size}", index, 1, TODAY)), repeat * 10)
+    res["render_month_view[uncached]"] = timeit(lambda: month_html(index, TODAY.year, TODAY.month, "#AED9E0"), repeat * 10)
+    cached_month_html(f"bench_{size}", index, TODAY.year, TODAY.month, 1, "#AED9E0")
+    res["render_month_view[cached]"] = timeit(
+        lambda: cached_month_html(f"bench_{size}", index, TODAY.year, TODAY.month, 1, "#AED9E0"), repeat * 10)
+    return res
+
+
+def app_reruns(size, workdir, reruns):
+    """Reruns completas de app.py (login y encuesta ya hechos) sobre un usuario con `size` eventos."""
+    from streamlit.testing.v1 import AppTest
+    cwd = os.getcwd()
+    os.chdir(workdir)
+    try:
+        import storage
+        store = storage.get_store()
+        user = f"app_{size}"
+        data = store.load(user)
+        data["events"] = synthetic_events(size, seed=1)
+        store.save(user, data)
+
+        at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=120)
+        at.session_state["logged_in"] = True
+        at.session_state["user"] = user
+        at.session_state["survey_done"] = True
+        at.session_state["survey_summary"] = {"prom": 6}
+        at.run()
+        res = {}
+        for view in ("Chat de ayuda", "Calendario ANIMA", "Grupos de apoyo"):
+            at.sidebar.radio[0].set_value(view).run()
+            samples = []
+            for _ in range(reruns):
+                t0 = time.perf_counter()
+                at.run()
+                samples.append(time.perf_counter() - t0)
+            res[f"app_rerun[{view}]"] = {"median_s": statistics.median(samples), "min_s": min(samples), "runs": reruns,
+                                         "peak_bytes": peak_memory(at.run)}
+            if at.exception:
+                raise RuntimeError(f"{view}: {at.exception}")
+        at.sidebar.radio[0].set_value("Chat de ayuda").run()
+        t0 = time.perf_counter()
+        at.chat_input[0].set_value("estoy estresado por el certamen").run()
+        res["app_rerun[chat message]"] = {"median_s": time.perf_counter() - t0, "min_s": time.perf_counter() - t0, "runs": 1}
+        at.sidebar.radio[0].set_value("Calendario ANIMA").run()
+        samples = []
+        for _ in range(reruns):
+            t0 = time.perf_counter()
+            [b for b in at.button if b.label == "Mes siguiente ▶️"][0].click().run()
+            samples.append(time.perf_counter() - t0)
+        res["app_rerun[month navigation]"] = {"median_s": statistics.median(samples), "min_s": min(samples), "runs": reruns}
+        return res
+    finally:
+        os.chdir(cwd)
+
+
+def compare(results, baseline, tolerance):
+    regressions = []
+    for size, cases in results["sizes"].items():
+        for case, r in cases.items():
+            old = baseline.get("sizes", {}).get(size, {}).get(case)
+            if not old:
+                continue
+            for metric in ("median_s", "peak_bytes"):
+                if metric in r and metric in old and old[metric] > 0:
+                    ratio = r[metric] / old[metric]
+                    r.setdefault("vs_baseline", {})[metric] = round(ratio, 3)
+                    # las mediciones de menos de 50µs son puro ruido: no cuentan como regresión
+                    if ratio > 1 + tolerance and not (metric == "median_s" and r[metric] < 5e-5):
+                        regressions.append(f"{size}/{case} {metric}: x{ratio:.2f}")
+    return regressions
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Benchmarks de ANIMA")
+    ap.add_argument("--sizes", default="100,1000,10000,100000", help="eventos por usuario (micro-benchmarks)")
+    ap.add_argument("--app-sizes", default="100,1000", help="eventos por usuario para las reruns de app.py ('' = omitir)")
+    ap.add_argument("--repeat", type=int, default=7)
+    ap.add_argument("--reruns", type=int, default=5)
+    ap.add_argument("--quick", action="store_true", help="menos repeticiones")
+    ap.add_argument("--out", default=os.path.join(ROOT, "bench", "results.json"))
+    ap.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="empeoramiento permitido (0.25 = +25%%)")
+    args = ap.parse_args()
+    if args.quick:
+        args.repeat, args.reruns = 3, 2
+
+    workdir = tempfile.mkdtemp(prefix="anima-bench-")
+    from fake_groq import serve
+    server, url = serve()
+    os.environ.update({"GROQ_BASE_URL": url, "GROQ_API_KEY": "bench", "ANIMA_DB": os.path.join(workdir, "app.db"),
+                       "ANIMA_FORUM_DB": os.path.join(workdir, "forums.db")})
+
+    results = {"meta": {"python": platform.python_version(), "platform": platform.platform(), "today": str(TODAY),
+                        "started": time.strftime("%Y-%m-%dT%H:%M:%S")}, "sizes": {}}
+    for size in [int(s) for s in args.sizes.split(",") if s]:
+        print(f"micro {size} eventos...", flush=True)
+        results["sizes"].setdefault(str(size), {}).update(micro(size, workdir, args.repeat))
+    for size in [int(s) for s in args.app_sizes.split(",") if s]:
+        print(f"app.py {size} eventos...", flush=True)
+        results["sizes"].setdefault(str(size), {}).update(app_reruns(size, workdir, args.reruns))
+    server.shutdown()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as fh:
+            regressions = compare(results, json.load(fh), args.tolerance)
+        results["regressions"] = regressions
+    with open(args.out, "w", encoding="utf-8") as fh:
+        json.dump(results, fh, indent=2, ensure_ascii=False)
+
+    for size, cases in results["sizes"].items():
+        print(f"\n== {size} eventos ==")
+        for case, r in cases.items():
+            mem = f"  peak {r['peak_bytes'] / 1e6:.1f} MB" if "peak_bytes" in r else ""
+            cmp = f"  (x{r['vs_baseline']['median_s']:.2f})" if "median_s" in r.get("vs_baseline", {}) else ""
+            print(f"  {case:42s} {r['median_s'] * 1000:10.3f} ms{mem}{cmp}")
+    print(f"\nresultados en {args.out}")
+    if regressions:
+        print("REGRESIONES:\n  " + "\n  ".join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,71 @@
+# bench/screen_bench.py - Latencia por mensaje del screening local de riesgo (screening.Matcher)
+#
+# Uso:  python bench/screen_bench.py --messages 20000 --budget-us 50
+# Compara con el escaneo anterior (normalize_prompt + `term in text` por cada término) y verifica que
+# ambos marquen los mismos mensajes del corpus de ejemplo, y que todas las formas frecuentes de expresar una
+# crisis (CRISIS) calcen en esa categoría. Sale con 1 si falta alguna o si el p99 supera el presupuesto.
+import argparse, os, random, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from reply_cache import normalize_prompt
+from screening import DEFAULT_LEXICON, RISK_CATEGORIES, Matcher
+
+SAFE = ["hola, ¿cómo organizo mi semana?", "estoy estresado por el certamen de cálculo",
+        "no duermo bien antes de las pruebas", "gracias ANIMA, me ayudó harto", "¿me recuerdas la entrega del viernes?"]
+RISKY = ["ya no puedo más con todo", "a veces pienso en quitarme la vida", "quiero hablar con un psicólogo",
+         "tuve un ataque de ansiedad en clases", "siento que quiero desaparecer", "me dan ganas de hacerme daño"]
+# corpus fijo: cada frase tiene que marcarse como "crisis"
+CRISIS = ["me quiero morir", "quiero morir", "Quiero morirme ya", "tengo ganas de morir", "me quiero matar",
+          "pienso en matarme", "no aguanto más", "ya no aguanto", "me hago daño cuando estoy mal",
+          "quiero hacerme daño", "pienso en suicidarme", "pensamientos suicidas", "no quiero vivir así",
+          "no quiero seguir", "quiero quitarme la vida", "me corto / cortarme", "me autolesiono",
+          "quiero desaparecer", "no puedo más", "estoy desesperada"]
+OLD_TERMS = tuple(t for cat in RISK_CATEGORIES for t in DEFAULT_LEXICON[cat])
+
+
+def old_scan(text):
+    text = normalize_prompt(text)
+    return any(t in text for t in OLD_TERMS)
+
+def corpus(n, seed=0):
+    rnd = random.Random(seed)
+    filler = "tengo clases toda la mañana y después ayudantía, además del trabajo grupal que no avanza. "
+    out = []
+    for i in range(n):
+        msg = rnd.choice(RISKY if i % 10 == 0 else SAFE)
+        out.append(filler * rnd.choice((0, 0, 1, 4)) + msg)  # mezcla de mensajes cortos y largos
+    return out
+
+def timed(fn, messages):
+    lat = []
+    for m in messages:
+        t0 = time.perf_counter()
+        fn(m)
+        lat.append(time.perf_counter() - t0)
+    lat.sort()
+    return lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] * 1e6
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Latencia del screening de riesgo por mensaje")
+    ap.add_argument("--messages", type=int, default=20000)
+    ap.add_argument("--budget-us", type=float, default=50.0, help="p99 máximo aceptado, en microsegundos")
+    args = ap.parse_args()
+
+    matcher = Matcher()
+    messages = corpus(args.messages)
+    mismatches = [m for m in SAFE + RISKY if matcher.is_risky(m) != old_scan(m)]
+    missed = [m for m in CRISIS if (matcher.match(m) or ("",))[0] != "crisis"]
+    t0 = time.perf_counter()
+    Matcher()
+    build_ms = (time.perf_counter() - t0) * 1000
+    for name, fn in (("anterior", old_scan), ("matcher", matcher.is_risky)):
+        pct = timed(fn, messages)
+        print(f"{name:<10} p50={pct(.5):.1f}us p95={pct(.95):.1f}us p99={pct(.99):.1f}us")
+    print(f"compilación del léxico={build_ms:.2f}ms  diferencias con el escaneo anterior={mismatches}")
+    print(f"frases de crisis detectadas={len(CRISIS) - len(missed)}/{len(CRISIS)}  sin detectar={missed}")
+    return 1 if mismatches or missed or timed(matcher.is_risky, messages)(.99) > args.budget_us else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
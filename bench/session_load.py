@@ -0,0 +1,199 @@
+# bench/session_load.py - N sesiones concurrentes contra un servidor Streamlit real: CPU del servidor por interacción
+#
+# Uso:  python bench/session_load.py --sessions 20 --rounds 5     # antes / fragmentos / fragmentos + gc.freeze
+#       python bench/session_load.py --sessions 50 --configs antes,despues --events 1000
+# Levanta `streamlit run app.py` en un directorio temporal con Groq apuntando a bench/fake_groq.py y abre N
+# sesiones por el mismo websocket (/_stcore/stream) que usa el navegador: inicia sesión, responde la encuesta y
+# después, todas a la vez por etapa, manda mensajes al chat, cambia de mes y publica en el foro. Los clics
+# dentro de un fragmento viajan con su fragment_id, como en el navegador. Por etapa reporta la CPU del proceso
+# servidor (utime+stime de /proc/<pid>/stat, solo Linux) dividida por las interacciones, y la latencia
+# p50/p95 hasta el script_finished.
+import argparse, os, shutil, socket, statistics, subprocess, sys, tempfile, time, urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from websockets.sync.client import connect
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+from storage import SqliteBackend, UserStore
+from fake_groq import serve
+from run_bench import synthetic_events
+
+# "antes" = reruns completas y GC recorriendo todo el heap en cada rerun (la app antes de los fragmentos)
+CONFIGS = {
+    "antes": {"ANIMA_FRAGMENTS": "0", "ANIMA_GC_FREEZE": "0"},
+    "fragmentos": {"ANIMA_FRAGMENTS": "1", "ANIMA_GC_FREEZE": "0"},
+    "despues": {"ANIMA_FRAGMENTS": "1", "ANIMA_GC_FREEZE": "1"},
+}
+DONE = (ForwardMsg.FINISHED_SUCCESSFULLY, ForwardMsg.FINISHED_FRAGMENT_RUN_SUCCESSFULLY)
+MESSAGES = ["estoy estresado por el certamen", "¿cómo organizo mi semana?", "no duermo bien antes de las pruebas"]
+
+
+def server_cpu(pid):
+    with open(f"/proc/{pid}/stat") as fh:
+        fields = fh.read().rsplit(")", 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class Session:
+    """Un navegador mínimo: manda los valores de widgets que tiene y espera el script_finished de cada rerun."""
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.widgets = {}   # id -> WidgetState con valor persistente (inputs, radio, sliders)
+        self.elements = {}  # label -> (widget id, fragment_id)
+
+    def run(self, trigger=None, fragment_id=""):
+        msg = BackMsg()
+        msg.rerun_script.query_string = ""
+        msg.rerun_script.page_script_hash = ""
+        if fragment_id:
+            msg.rerun_script.fragment_id = fragment_id
+        states = [w for i, w in self.widgets.items() if trigger is None or i != trigger.id]
+        msg.rerun_script.widget_states.widgets.extend(states + ([trigger] if trigger is not None else []))
+        t0 = time.perf_counter()
+        self.ws.send(msg.SerializeToString())
+        while True:
+            fwd = ForwardMsg()
+            fwd.ParseFromString(self.ws.recv())
+            kind = fwd.WhichOneof("type")
+            if kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                el = fwd.delta.new_element
+                proto = getattr(el, el.WhichOneof("type"))
+                if el.WhichOneof("type") == "exception":
+                    raise RuntimeError(f"excepción en app.py: {proto.message}\n" + "\n".join(proto.stack_trace[-6:]))
+                label = getattr(proto, "label", "") or getattr(proto, "placeholder", "")
+                if getattr(proto, "id", "") and label:
+                    self.elements[label] = (proto.id, fwd.delta.fragment_id)
+            elif kind == "script_finished" and fwd.script_finished in DONE:
+                return time.perf_counter() - t0
+
+    def set(self, label, **value):
+        self.widgets[self.elements[label][0]] = WidgetState(id=self.elements[label][0], **value)
+
+    def trigger(self, label, **value):
+        wid, fragment_id = self.elements[label]
+        return self.run(WidgetState(id=wid, **value), fragment_id)
+
+    def click(self, label):
+        return self.trigger(label, trigger_value=True)
+
+
+def login(session, n):
+    session.run()
+    session.set("Correo institucional UDD", string_value=f"carga.{n}@udd.cl")
+    session.set("Contraseña", string_value="secreta")
+    session.click("Iniciar sesión")
+    session.click("Enviar encuesta")
+
+def open_view(view):
+    def setup(session):
+        session.set("Ir a:", string_value=view)
+        session.run()
+    return setup
+
+def send_messages(session, rounds):
+    return [session.trigger("Escribe aquí tu mensaje...", chat_input_value={"data": MESSAGES[i % len(MESSAGES)]})
+            for i in range(rounds)]
+
+def next_months(session, rounds):
+    return [session.click("Mes siguiente ▶️") for _ in range(rounds)]
+
+def post_comments(session, rounds):
+    lat = []
+    for i in range(rounds):
+        session.set("Escribe un comentario", string_value=f"ánimo a todos ({i})")
+        lat.append(session.click("Publicar comentario"))
+    return lat
+
+# (etapa, llegar a la vista: no se mide, interacciones medidas)
+STAGES = [("mensaje de chat", open_view("Chat de ayuda"), send_messages),
+          ("cambio de mes", open_view("Calendario ANIMA"), next_months),
+          ("publicar en el foro", open_view("Grupos de apoyo"), post_comments)]
+
+
+def run_config(config, args, groq_url):
+    workdir = tempfile.mkdtemp(prefix="anima-load-")
+    shutil.copytree(os.path.join(ROOT, ".streamlit"), os.path.join(workdir, ".streamlit"))  # config del repo
+    store = UserStore(SqliteBackend(os.path.join(workdir, "anima.db"), legacy_dir=workdir))
+    for n in range(args.sessions):
+        data = store.load(f"carga.{n}")
+        data["events"] = synthetic_events(args.events, seed=n)
+        store.save(f"carga.{n}", data)
+
+    port = free_port()
+    env = dict(os.environ, GROQ_BASE_URL=groq_url, GROQ_API_KEY="bench", ANIMA_DB=os.path.join(workdir, "anima.db"),
+               **CONFIGS[config])
+    server = subprocess.Popen(
+        [sys.executable, "-m", "streamlit", "run", os.path.join(ROOT, "app.py"), "--server.headless", "true",
+         "--server.port", str(port), "--server.enableXsrfProtection", "false", "--server.enableCORS", "false",
+         "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = time.time() + 60
+        while True:
+            try:
+                urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1)
+                break
+            except OSError:
+                if time.time() > deadline or server.poll() is not None:
+                    raise RuntimeError("el servidor Streamlit no levantó")
+                time.sleep(0.2)
+
+        url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        conns = [connect(url, subprotocols=["streamlit"], max_size=None, open_timeout=30).__enter__() for _ in range(args.sessions)]
+        sessions = [Session(ws) for ws in conns]
+        results = {}
+        with ThreadPoolExecutor(args.sessions) as ex:
+            list(ex.map(login, sessions, range(args.sessions)))
+            for name, setup, stage in STAGES:
+                list(ex.map(setup, sessions))
+                cpu0 = server_cpu(server.pid)
+                lat = [x for r in ex.map(stage, sessions, [args.rounds] * args.sessions) for x in r]
+                cpu = server_cpu(server.pid) - cpu0
+                lat.sort()
+                results[name] = {"cpu_ms": cpu / len(lat) * 1000, "p50_ms": statistics.median(lat) * 1000,
+                                 "p95_ms": lat[int(0.95 * (len(lat) - 1))] * 1000}
+        for ws in conns:
+            ws.close()
+        return results
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Sesiones concurrentes contra app.py con LLM falso")
+    ap.add_argument("--sessions", type=int, default=20)
+    ap.add_argument("--rounds", type=int, default=5, help="interacciones por sesión y etapa")
+    ap.add_argument("--events", type=int, default=200, help="eventos en el calendario de cada usuario")
+    ap.add_argument("--latency", type=float, default=0.05, help="latencia del LLM falso (s)")
+    ap.add_argument("--configs", default="antes,fragmentos,despues", help=f"de {', '.join(CONFIGS)}; la primera es la base")
+    args = ap.parse_args()
+
+    groq, groq_url = serve(first_delay=args.latency)
+    results = {}
+    for config in args.configs.split(","):
+        print(f"{config}: {args.sessions} sesiones x {args.rounds} interacciones por etapa...", flush=True)
+        results[config] = run_config(config, args, groq_url)
+    groq.shutdown()
+
+    base = next(iter(results.values()))
+    print(f"\n{'etapa':<22}{'config':<14}{'CPU ms/interacción':>20}{'vs base':>9}{'p50 ms':>10}{'p95 ms':>10}")
+    for name, _, _ in STAGES:
+        for config, res in results.items():
+            r = res[name]
+            ratio = r["cpu_ms"] / base[name]["cpu_ms"] if base[name]["cpu_ms"] else 0
+            print(f"{name:<22}{config:<14}{r['cpu_ms']:>20.1f}{ratio:>8.2f}x{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
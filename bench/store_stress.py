@@ -0,0 +1,87 @@
+# bench/store_stress.py - Escritores en paralelo (procesos x hilos) sobre el mismo usuario, sin pérdidas
+#
+# Uso:  python bench/store_stress.py --backend both --procs 4 --threads 4 --writes 25
+# Cada escritor hace load -> agrega un evento / edita uno propio / cambia una pref -> save, como dos pestañas
+# o varios servidores Streamlit a la vez. Al final todos los eventos tienen que estar, con su última edición,
+# y la versión tiene que ser igual a la cantidad de commits. Sale con 1 si se perdió algo.
+import argparse, os, random, sys, tempfile, time
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from storage import JsonBackend, SqliteBackend, UserStore
+
+USER = "stress"
+
+
+def make_store(kind, workdir):
+    if kind == "json":
+        return UserStore(JsonBackend(workdir))
+    return UserStore(SqliteBackend(os.path.join(workdir, "stress.db"), legacy_dir=workdir))
+
+def writer(kind, workdir, proc, threads, writes):
+    store = make_store(kind, workdir)  # un store (y una conexión) por proceso, como un servidor real
+
+    def one(t):
+        rnd = random.Random(proc * 1000 + t)
+        mine = {}  # id -> última descripción escrita
+        commits = 0
+        for n in range(writes):
+            data = store.load(USER)
+            if mine and rnd.random() < 0.3:
+                # edita un evento propio en el dict cargado, lo marca con touch() y guarda con save()
+                eid = rnd.choice(list(mine))
+                for e in data["events"]:
+                    if e["id"] == eid:
+                        e["desc"] = mine[eid] = f"edit {proc}-{t}-{n}"
+                        data.touch(eid)
+            else:
+                e = store.add_event(USER, data, {"title": f"p{proc} t{t} #{n}", "date": "2026-10-20", "time": "", "desc": ""})
+                mine[e["id"]] = ""
+                commits += 1
+                data = store.load(USER)
+            data["prefs"][f"w{proc}_{t}"] = n
+            if store.save(USER, data):
+                commits += 1
+            time.sleep(rnd.random() * 0.002)
+        return commits, mine
+
+    with ThreadPoolExecutor(threads) as ex:
+        results = list(ex.map(one, range(threads)))
+    return sum(c for c, _ in results), {k: v for _, m in results for k, v in m.items()}
+
+def run(kind, procs, threads, writes):
+    workdir = tempfile.mkdtemp(prefix=f"anima_stress_{kind}_")
+    make_store(kind, workdir)  # crea el esquema antes de que compitan los procesos
+    t0 = time.perf_counter()
+    with get_context("spawn").Pool(procs) as pool:
+        results = pool.starmap(writer, [(kind, workdir, p, threads, writes) for p in range(procs)])
+    wall = time.perf_counter() - t0
+    commits = sum(c for c, _ in results)
+    written = {k: v for _, m in results for k, v in m.items()}
+    data = make_store(kind, workdir).load(USER)
+    saved = {e["id"]: e["desc"] for e in data["events"]}
+    lost_events = [i for i in written if i not in saved]
+    lost_edits = [i for i, desc in written.items() if i in saved and saved[i] != desc]
+    lost_prefs = [f"w{p}_{t}" for p in range(procs) for t in range(threads) if data["prefs"].get(f"w{p}_{t}") != writes - 1]
+    ok = data["version"] == commits and len(saved) == len(written) and not (lost_events or lost_edits or lost_prefs)
+    print(f"[{kind}] writers={procs}x{threads} commits={commits} version={data['version']} events={len(saved)}/{len(written)} "
+          f"wall={wall:.2f}s ({commits / wall:.0f} commits/s) perdidos: eventos={len(lost_events)} ediciones={len(lost_edits)} "
+          f"prefs={len(lost_prefs)} -> {'OK' if ok else 'PÉRDIDA'}")
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description="Escritores concurrentes sobre el store de usuario")
+    ap.add_argument("--backend", choices=["sqlite", "json", "both"], default="both")
+    ap.add_argument("--procs", type=int, default=4)
+    ap.add_argument("--threads", type=int, default=4)
+    ap.add_argument("--writes", type=int, default=25)
+    args = ap.parse_args()
+    kinds = ["sqlite", "json"] if args.backend == "both" else [args.backend]
+    ok = all([run(k, args.procs, args.threads, args.writes) for k in kinds])
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+# calendar_io.py - Importación / exportación masiva de calendarios (ICS y CSV) en streaming
+import csv, io, json, re
+from datetime import date, datetime, timezone
+
+from recurrence import rule_of
+
+CSV_FIELDS = ["title", "date", "time", "desc", "color", "recurrence"]
+# encabezados aceptados al importar (en inglés o español)
+CSV_ALIASES = {"titulo": "title", "título": "title", "fecha": "date", "hora": "time",
+               "descripcion": "desc", "descripción": "desc", "description": "desc", "repeticion": "recurrence"}
+ICS_DAYS = ["MO", "TU", "WE", "TH", "FR", "SA", "SU"]
+_TIME = re.compile(r"^([01]?\d|2[0-3]):([0-5]\d)$")
+
+
+class InvalidRecord(ValueError):
+    pass
+
+
+# ---------------- Lectura ----------------
+def iter_csv(fh):
+    """Registros (dict) de un CSV, fila a fila."""
+    reader = csv.DictReader(fh)
+    for row in reader:
+        rec = {}
+        for k, v in row.items():
+            if k is None:
+                continue
+            k = k.strip().lower()
+            rec[CSV_ALIASES.get(k, k)] = (v or "").strip()
+        if rec.get("recurrence"):
+            try:
+                rec["recurrence"] = json.loads(rec["recurrence"])
+            except ValueError:
+                rec["recurrence"] = "invalid"
+        yield rec
+
+
+def _unfold(fh):
+    # RFC 5545: una línea que empieza con espacio/tab continúa la anterior
+    pending = None
+    for raw in fh:
+        line = raw.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and pending is not None:
+            pending += line[1:]
+            continue
+        if pending is not None:
+            yield pending
+        pending = line
+    if pending is not None:
+        yield pending
+
+def _ics_text(v):
+    return v.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+def _ics_datetime(value):
+    """(fecha, "HH:MM" o "") a partir de 20261020 / 20261020T143000[Z]. Las horas en UTC (Z) se pasan a la hora
+    local del servidor, la misma que usa el resto de la app (date.today / datetime.now)."""
+    value = value.strip()
+    d = datetime.strptime(value[:8], "%Y%m%d").date()
+    if "T" in value and len(value) >= 13:
+        if value.upper().endswith("Z"):
+            local = datetime.strptime(value[:13], "%Y%m%dT%H%M").replace(tzinfo=timezone.utc).astimezone()
+            return local.date(), local.strftime("%H:%M")
+        return d, f"{value[9:11]}:{value[11:13]}"
+    return d, ""
+
+def _ics_rule(value):
+    parts = dict(p.split("=", 1) for p in value.split(";") if "=" in p)
+    freq = {"DAILY": "daily", "WEEKLY": "weekly"}.get(parts.get("FREQ", "").upper())
+    if freq is None:
+        return None  # frecuencias no soportadas: se importa solo la primera fecha
+    rule = {"freq": freq}
+    if parts.get("INTERVAL"):
+        rule["interval"] = int(parts["INTERVAL"])
+    if parts.get("BYDAY") and freq == "weekly":
+        rule["weekdays"] = [ICS_DAYS.index(d[-2:]) for d in parts["BYDAY"].split(",") if d[-2:] in ICS_DAYS]
+    if parts.get("UNTIL"):
+        rule["until"] = str(_ics_datetime(parts["UNTIL"])[0])
+    if parts.get("COUNT"):
+        rule["count"] = int(parts["COUNT"])
+    return rule
+
+def iter_ics(fh):
+    """Registros (dict) de cada VEVENT de un .ics, sin cargar el archivo completo."""
+    rec = None
+    depth = 0  # componentes anidados dentro del VEVENT (VALARM...): sus propiedades no son del evento
+    for line in _unfold(fh):
+        if line == "BEGIN:VEVENT":
+            rec, depth = {"except": []}, 0
+            continue
+        if rec is None:
+            continue
+        if line.upper().startswith("BEGIN:"):
+            depth += 1
+            continue
+        if depth:
+            if line.upper().startswith("END:"):
+                depth -= 1
+            continue
+        if line == "END:VEVENT":
+            if rec.pop("rrule", None) is not None and rec.get("recurrence"):
+                if rec["except"]:
+                    rec["recurrence"]["except"] = rec["except"]
+            rec.pop("except", None)
+            yield rec
+            rec = None
+            continue
+        name, _, value = line.partition(":")
+        name = name.split(";", 1)[0].upper()
+        try:
+            if name == "SUMMARY":
+                rec["title"] = _ics_text(value)
+            elif name == "DESCRIPTION":
+                rec["desc"] = _ics_text(value)
+            elif name == "UID":
+                rec["uid"] = value.strip()
+            elif name == "DTSTART":
+                d, t = _ics_datetime(value)
+                rec["date"], rec["time"] = str(d), t
+            elif name == "RRULE":
+                rec["rrule"] = value
+                rec["recurrence"] = _ics_rule(value)
+            elif name == "EXDATE":
+                rec["except"].extend(str(_ics_datetime(v)[0]) for v in value.split(","))
+        except (ValueError, IndexError):
+            rec["invalid"] = f"{name} inválido"
+
+
+# ---------------- Validación ----------------
+def clean_record(rec, default_color):
+    """Evento listo para guardar, o InvalidRecord con el motivo."""
+    if rec.get("invalid"):
+        raise InvalidRecord(rec["invalid"])
+    title = (rec.get("title") or "").strip()
+    if not title:
+        raise InvalidRecord("sin título")
+    try:
+        d = date.fromisoformat((rec.get("date") or "").strip()[:10])
+    except ValueError:
+        raise InvalidRecord(f"fecha inválida: {rec.get('date')!r}") from None
+    t = (rec.get("time") or "").strip()
+    if t and not _TIME.match(t):
+        raise InvalidRecord(f"hora inválida: {t!r}")
+    event = {"title": title, "date": str(d), "time": t, "desc": (rec.get("desc") or "").strip(),
+             "color": rec.get("color") or default_color}
+    if rec.get("uid"):
+        event["uid"] = rec["uid"]
+    if rec.get("recurrence"):
+        event["recurrence"] = rec["recurrence"]
+        if not isinstance(rec["recurrence"], dict) or rule_of(event) is None:
+            raise InvalidRecord("regla de repetición inválida")
+    return event
+
+def dedupe_keys(e):
+    # mismo título/fecha/hora, o mismo UID de iCalendar
+    keys = [(e.get("title", "").strip().casefold(), e.get("date"), e.get("time") or "")]
+    if e.get("uid"):
+        keys.append(e["uid"])
+    return keys
+
+
+def import_events(records, store, username, data, index=None, default_color="#AED9E0", batch_size=1000):
+    """Valida, descarta duplicados (contra el calendario y dentro del archivo) y guarda en lotes.
+
+    `records` es un iterador (iter_csv / iter_ics): nunca se arma la lista completa del archivo.
+    Devuelve {"added", "duplicates", "invalid", "errors"} (errors: los primeros motivos, con su número de registro).
+    """
+    seen = {k for e in data.get("events", []) for k in dedupe_keys(e)}
+    stats = {"added": 0, "duplicates": 0, "invalid": 0, "errors": []}
+    batch = []
+
+    def flush():
+        for e in store.add_events(username, data, batch):
+            if index is not None:
+                index.add(e)
+        stats["added"] += len(batch)
+        batch.clear()
+
+    for n, rec in enumerate(records, 1):
+        try:
+            event = clean_record(rec, default_color)
+        except InvalidRecord as e:
+            stats["invalid"] += 1
+            if len(stats["errors"]) < 10:
+                stats["errors"].append(f"registro {n}: {e}")
+            continue
+        keys = dedupe_keys(event)
+        if any(k in seen for k in keys):
+            stats["duplicates"] += 1
+            continue
+        seen.update(keys)
+        batch.append(event)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
+
+
+def open_text(upload):
+    """Vista de texto (utf-8, tolera BOM) sobre un archivo binario subido, para leerlo línea a línea."""
+    return io.TextIOWrapper(upload, encoding="utf-8-sig", errors="replace", newline="")
+
+
+# ---------------- Escritura ----------------
+def write_csv(events, fh):
+    w = csv.DictWriter(fh, fieldnames=CSV_FIELDS, extrasaction="ignore")
+    w.writeheader()
+    for e in events:
+        row = dict(e)
+        row["recurrence"] = json.dumps(e["recurrence"], ensure_ascii=False) if e.get("recurrence") else ""
+        w.writerow(row)
+
+def _ics_escape(v):
+    return v.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,").replace("\n", "\\n")
+
+def _fold(line):
+    # líneas de máximo 75 octetos, sin cortar caracteres multibyte
+    out, cur, size = [], "", 0
+    for ch in line:
+        n = len(ch.encode("utf-8"))
+        if size + n > 75:
+            out.append(cur)
+            cur, size = " ", 1
+        cur += ch
+        size += n
+    out.append(cur)
+    return "\r\n".join(out) + "\r\n"
+
+def _ics_time(value):
+    """"HHMM" con ceros ("9:00" -> "0900"), o "" si la hora (texto libre en la app) no es válida."""
+    m = _TIME.match((value or "").strip())
+    return f"{int(m.group(1)):02d}{m.group(2)}" if m else ""
+
+def iter_ics_lines(events, stamp=None):
+    stamp = stamp or datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\nVERSION:2.0\r\nPRODID:-//ANIMA UDD//Calendario//ES\r\n"
+    for e in events:
+        d = e.get("date", "").replace("-", "")
+        t = _ics_time(e.get("time"))  # sin hora válida ("tarde") se exporta como evento de día completo
+        lines = ["BEGIN:VEVENT", f"UID:{e.get('uid') or e.get('id') + '@anima'}", f"DTSTAMP:{stamp}",
+                 f"DTSTART:{d}T{t}00" if t else f"DTSTART;VALUE=DATE:{d}",
+                 f"SUMMARY:{_ics_escape(e.get('title', ''))}"]
+        if e.get("desc"):
+            lines.append(f"DESCRIPTION:{_ics_escape(e['desc'])}")
+        rule = e.get("recurrence")
+        if rule:
+            parts = [f"FREQ={rule.get('freq', 'weekly').upper()}"]
+            if rule.get("interval"):
+                parts.append(f"INTERVAL={rule['interval']}")
+            if rule.get("weekdays"):
+                parts.append("BYDAY=" + ",".join(ICS_DAYS[wd] for wd in rule["weekdays"]))
+            # RFC 5545: UNTIL y EXDATE con el mismo tipo de valor que DTSTART (fecha u hora local)
+            if rule.get("until"):
+                parts.append(f"UNTIL={rule['until'].replace('-', '')}" + ("T235959" if t else ""))
+            if rule.get("count"):
+                parts.append(f"COUNT={rule['count']}")
+            lines.append("RRULE:" + ";".join(parts))
+            for x in rule.get("except", ()):
+                lines.append(f"EXDATE:{x.replace('-', '')}T{t}00" if t else f"EXDATE;VALUE=DATE:{x.replace('-', '')}")
+        lines.append("END:VEVENT")
+        yield "".join(_fold(l) for l in lines)
+    yield "END:VCALENDAR\r\n"
+
+def write_ics(events, fh):
+    for chunk in iter_ics_lines(events):
+        fh.write(chunk)
@@ -0,0 +1,135 @@
+# chatlog.py - Historial de chat persistente por usuario (log segmentado en disco) y anillo acotado en sesión
+#
+# Cada turno (mensaje del estudiante + respuesta de ANIMA) se agrega como una línea JSON en
+# chatlog/<user>/<segmento>.jsonl. Todos los segmentos tienen exactamente `segment_turns` turnos salvo el
+# último, así el turno n está en el segmento n // segment_turns: una página del Historial abre uno o dos
+# archivos chicos y nunca relee la conversación completa.
+import json, os, threading
+
+from locks import file_lock
+
+SEGMENT_TURNS = 200
+
+
+class ChatLog:
+    """Append-only por usuario; los números de turno (0 = el primero) sirven de cursor para paginar."""
+
+    def __init__(self, directory="chatlog", segment_turns=SEGMENT_TURNS):
+        self.directory = directory
+        self.segment_turns = segment_turns
+        self._lock = threading.Lock()
+        self._tail = {}  # user -> (segmento, turnos, bytes) del último segmento visto por este proceso
+
+    def _dir(self, username):
+        return os.path.join(self.directory, username.replace(" ", "_").replace(os.sep, "_"))
+
+    def _segment(self, username, k):
+        return os.path.join(self._dir(username), f"{k:06d}.jsonl")
+
+    def _last_segment(self, username):
+        try:
+            names = os.listdir(self._dir(username))
+        except FileNotFoundError:
+            return -1
+        return max((int(n[:-6]) for n in names if n.endswith(".jsonl") and n[:-6].isdigit()), default=-1)
+
+    def locked(self, username):
+        os.makedirs(self._dir(username), exist_ok=True)
+        return file_lock(os.path.join(self._dir(username), ".lock"), self._lock)
+
+    def _tail_count(self, username, k, path):
+        """Turnos completos del último segmento; con el lock tomado descarta una línea a medio escribir."""
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        cached = self._tail.get(username)
+        if cached and cached[0] == k and cached[2] == size:
+            return cached[1]
+        if not size:
+            return 0
+        with open(path, "rb+") as fh:
+            raw = fh.read()
+            if not raw.endswith(b"\n"):
+                # un proceso murió escribiendo: se corta la línea incompleta para no pegarle la siguiente
+                raw = raw[:raw.rfind(b"\n") + 1]
+                fh.truncate(len(raw))
+        return raw.count(b"\n")
+
+    def append(self, username, turn):
+        """Agrega un turno y devuelve su número."""
+        line = (json.dumps(turn, ensure_ascii=False) + "\n").encode("utf-8")
+        with self.locked(username):
+            k = max(0, self._last_segment(username))
+            path = self._segment(username, k)
+            n = self._tail_count(username, k, path)
+            if n >= self.segment_turns:
+                k, n = k + 1, 0
+                path = self._segment(username, k)
+            with open(path, "ab") as fh:
+                fh.write(line)
+                fh.flush()
+                os.fsync(fh.fileno())
+                self._tail[username] = (k, n + 1, fh.tell())
+            return k * self.segment_turns + n
+
+    def count(self, username):
+        k = self._last_segment(username)
+        if k < 0:
+            return 0
+        with open(self._segment(username, k), "rb") as fh:
+            return k * self.segment_turns + fh.read().count(b"\n")
+
+    def page(self, username, before=None, limit=20):
+        """Hasta `limit` turnos anteriores al número `before` (o los más recientes), en orden cronológico.
+        Cada turno trae su número en "n"."""
+        total = self.count(username)
+        hi = total if before is None else min(before, total)
+        lo = max(0, hi - limit)
+        turns = []
+        for k in range(lo // self.segment_turns, -(-hi // self.segment_turns)):
+            first = k * self.segment_turns
+            with open(self._segment(username, k), encoding="utf-8") as fh:
+                for i, line in enumerate(fh):
+                    n = first + i
+                    if n >= hi or not line.endswith("\n"):
+                        break
+                    if n >= lo:
+                        turns.append(dict(json.loads(line), n=n))
+        return turns
+
+
+class RecentTurns:
+    """Turnos recientes de la sesión: lo que se pinta en el chat y lo que entra al contexto del modelo.
+
+    Guarda a lo más `size` turnos, salvo los que ConversationContext todavía no plegó en su resumen (que caben
+    en su presupuesto de tokens por construcción). `offset` es cuántos turnos de la sesión ya se descartaron.
+    """
+
+    def __init__(self, size=20):
+        self.size = size
+        self.turns = []
+        self.offset = 0
+
+    def append(self, turn):
+        self.turns.append(turn)
+
+    def trim(self, folded):
+        drop = min(len(self.turns) - self.size, folded - self.offset)
+        if drop > 0:
+            del self.turns[:drop]
+            self.offset += drop
+
+    def __iter__(self):
+        return iter(self.turns)
+
+    def __len__(self):
+        return len(self.turns)
+
+
+_log = None
+_log_lock = threading.Lock()
+
+def get_chat_log():
+    global _log
+    with _log_lock:
+        if _log is None:
+            _log = ChatLog(os.getenv("ANIMA_CHATLOG_DIR", "chatlog"))
+        return _log
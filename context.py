@@ -0,0 +1,103 @@
+# context.py - Contexto multi-turno para ANIMA con presupuesto de tokens y resumen incremental
+import os
+
+SUMMARY_MODEL = os.getenv("ANIMA_SUMMARY_MODEL", "llama-3.1-8b-instant")
+
+SUMMARY_PROMPT = (
+    "Eres el módulo de memoria de ANIMA. Actualiza el resumen de la conversación con los nuevos turnos. "
+    "Conserva lo importante para acompañar al estudiante (estado de ánimo, evaluaciones, fechas, acuerdos, señales de riesgo). "
+    "Responde solo con el resumen, en español, en menos de {words} palabras."
+)
+
+
+def estimate_tokens(text):
+    # aproximación sin tokenizer: ~4 caracteres por token + overhead por mensaje
+    return len(text) // 4 + 4
+
+def message_tokens(messages):
+    return sum(estimate_tokens(m["content"]) for m in messages)
+
+def turn_messages(turn):
+    return [{"role": "user", "content": turn["user"]}, {"role": "assistant", "content": turn["bot"]}]
+
+def _transcript(turns):
+    return "\n".join(f"Estudiante: {t['user']}\nANIMA: {t['bot']}" for t in turns)
+
+
+class ConversationContext:
+    """Arma los mensajes de cada request a partir de los turnos de la sesión sin pasarse de `budget` tokens.
+
+    Los turnos recientes van tal cual; los que ya no caben se pliegan (una sola vez cada uno) en un
+    resumen que se actualiza incrementalmente y nunca pasa de `summary_budget` tokens. Al plegar se deja lo
+    reciente en `refill` del espacio disponible: el resumen (una llamada al modelo antes de la respuesta) se
+    hace cada varios mensajes y no en casi todos una vez lleno el presupuesto.
+    """
+
+    def __init__(self, budget=1500, summary_budget=300, summarizer=None, refill=0.5):
+        self.budget = budget
+        self.summary_budget = summary_budget
+        self.refill = refill
+        self.summarizer = summarizer  # fn(resumen_actual, turnos) -> resumen nuevo
+        self.summary = ""
+        self.folded = 0  # cuántos turnos de la sesión (contando desde el primero) ya están dentro del resumen
+        self.last_prompt_tokens = 0
+
+    def _clip_summary(self, text):
+        limit = self.summary_budget * 4
+        return text if len(text) <= limit else "…" + text[-limit:]
+
+    def _fold(self, turns):
+        summary = None
+        if self.summarizer is not None:
+            try:
+                summary = self.summarizer(self.summary, turns)
+            except Exception:
+                summary = None
+        if not summary:
+            # sin modelo disponible: resumen extractivo (lo más reciente se conserva)
+            summary = (self.summary + "\n" + _transcript(turns)).strip()
+        self.summary = self._clip_summary(summary.strip())
+
+    @staticmethod
+    def _fit(history, lo, room):
+        """Primer índice >= lo desde el cual los turnos de `history` caben en `room` tokens."""
+        start = len(history)
+        while start > lo:
+            cost = message_tokens(turn_messages(history[start - 1]))
+            if cost > room:
+                break
+            room -= cost
+            start -= 1
+        return start
+
+    def build(self, system_messages, history, prompt, offset=0):
+        """Lista completa de mensajes para el modelo: sistema, resumen, turnos recientes y el mensaje nuevo.
+        `offset`: turnos de la sesión que ya no están en `history` (chatlog.RecentTurns solo descarta
+        turnos ya plegados)."""
+        current = [{"role": "user", "content": prompt}]
+        # se reserva siempre el espacio del resumen, así el tamaño queda acotado aunque crezca
+        room = self.budget - message_tokens(system_messages) - message_tokens(current) - self.summary_budget
+        folded = max(0, self.folded - offset)  # posición en `history` del primer turno sin plegar
+        start = self._fit(history, folded, room)
+        if start > folded:
+            start = self._fit(history, start, room * self.refill)
+            self._fold(history[folded:start])
+            self.folded = offset + start
+        recent = [m for t in history[start:] for m in turn_messages(t)]
+        summary = [{"role": "system", "content": f"Resumen de la conversación previa: {self.summary}"}] if self.summary else []
+        messages = system_messages + summary + recent + current
+        self.last_prompt_tokens = message_tokens(messages)
+        return messages
+
+
+def llm_summarizer(gateway, words=120):
+    """Summarizer que usa el gateway (modelo chico); si falla, ConversationContext cae al extractivo."""
+    def summarize(summary, turns):
+        if gateway.client is None:
+            return None
+        user = (f"Resumen actual:\n{summary or '(vacío)'}\n\nNuevos turnos:\n{_transcript(turns)}")
+        return gateway.complete(
+            [{"role": "system", "content": SUMMARY_PROMPT.format(words=words)}, {"role": "user", "content": user}],
+            model=SUMMARY_MODEL, timeout=10,
+        )
+    return summarize
@@ -0,0 +1,218 @@
+# events.py - Índice en memoria de eventos por fecha y consultas del calendario
+import re, unicodedata
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from heapq import merge
+from operator import itemgetter
+from recurrence import rule_of
+
+
+def parse_date(d):
+    if isinstance(d, str):
+        return datetime.fromisoformat(d).date()
+    if isinstance(d, date):
+        return d
+    return None
+
+def title_tokens(text):
+    # minúsculas y sin tildes: "Cálculo" se encuentra buscando "calc"
+    text = unicodedata.normalize("NFKD", (text or "").casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return set(re.findall(r"\w+", text))
+
+def _safe_date(e):
+    try:
+        return parse_date(e.get("date"))
+    except ValueError:
+        return None
+
+
+class EventIndex:
+    """Eventos agrupados por día + lista ordenada de días con eventos.
+
+    Se construye una vez por carga y se actualiza en add/update/remove; las consultas usan
+    bisect sobre los días, así el costo depende de la ventana pedida y no del historial completo.
+    Las series (eventos con "recurrence") se guardan una vez y se expanden solo para la ventana
+    consultada; cada expansión queda en caché hasta que cambie alguna serie.
+    También indexa las palabras de los títulos (prefijos vía bisect) para la búsqueda del editor.
+    """
+
+    MAX_EXPANSIONS = 64
+
+    def __init__(self, events=()):
+        self._days = {}    # date -> [eventos]
+        self._series = {}  # id -> (primera fecha, Rule, evento)
+        self._expanded = OrderedDict()  # (desde, hasta) -> [(fecha, evento)] de las series
+        self._where = {}   # id -> date
+        self._by_id = {}   # id -> evento
+        self._words = {}   # palabra del título -> {ids}
+        self._tokens = {}  # id -> palabras con que quedó indexado (el dict se edita en el lugar)
+        for e in events:
+            d = _safe_date(e)
+            if d is None:
+                continue
+            rule = rule_of(e) if "id" in e else None
+            if rule is not None:
+                self._series[e["id"]] = (d, rule, e)
+            else:
+                self._days.setdefault(d, []).append(e)
+            if "id" in e:
+                self._where[e["id"]] = d
+                self._by_id[e["id"]] = e
+                words = self._tokens[e["id"]] = title_tokens(e.get("title"))
+                for w in words:
+                    self._words.setdefault(w, set()).add(e["id"])
+        self._dates = sorted(self._days)
+        self._vocab = sorted(self._words)
+
+    def __len__(self):
+        return sum(len(v) for v in self._days.values()) + len(self._series)
+
+    def add(self, e):
+        d = _safe_date(e)
+        if d is None:
+            return
+        rule = rule_of(e) if "id" in e else None
+        if rule is not None:
+            self._series[e["id"]] = (d, rule, e)
+            self._expanded.clear()
+        else:
+            bucket = self._days.get(d)
+            if bucket is None:
+                bucket = self._days[d] = []
+                self._dates.insert(bisect_left(self._dates, d), d)
+            bucket.append(e)
+        if "id" in e:
+            self._where[e["id"]] = d
+            self._by_id[e["id"]] = e
+            words = self._tokens[e["id"]] = title_tokens(e.get("title"))
+            for w in words:
+                ids = self._words.get(w)
+                if ids is None:
+                    ids = self._words[w] = set()
+                    insort(self._vocab, w)
+                ids.add(e["id"])
+
+    def remove(self, event_id):
+        d = self._where.pop(event_id, None)
+        if d is None:
+            return None
+        e = self._by_id.pop(event_id)
+        for w in self._tokens.pop(event_id):
+            ids = self._words.get(w)
+            if ids is not None:
+                ids.discard(event_id)
+                if not ids:
+                    del self._words[w]
+                    self._vocab.pop(bisect_left(self._vocab, w))
+        if self._series.pop(event_id, None) is not None:
+            self._expanded.clear()
+            return e
+        bucket = self._days[d]
+        for i, x in enumerate(bucket):
+            if x.get("id") == event_id:
+                bucket.pop(i)
+                break
+        if not bucket:
+            del self._days[d]
+            self._dates.pop(bisect_left(self._dates, d))
+        return e
+
+    def update(self, e):
+        # el evento pudo cambiar de fecha, título o regla: se saca de los índices viejos y entra a los nuevos
+        self.remove(e["id"])
+        self.add(e)
+
+    def _occurrences(self, start, end):
+        """Ocurrencias de todas las series en [start, end], memoizadas por ventana."""
+        if not self._series:
+            return []
+        key = (start, end)
+        hit = self._expanded.get(key)
+        if hit is not None:
+            self._expanded.move_to_end(key)
+            return hit
+        out = [(d, e) for first, rule, e in self._series.values() for d in rule.occurrences(first, start, end)]
+        out.sort(key=itemgetter(0))
+        self._expanded[key] = out
+        if len(self._expanded) > self.MAX_EXPANSIONS:
+            self._expanded.popitem(last=False)
+        return out
+
+    def on_day(self, d):
+        d = parse_date(d)
+        return list(self._days.get(d, ())) + [e for _, e in self._occurrences(d, d)]
+
+    def _span(self, start, end):
+        lo = bisect_left(self._dates, start)
+        hi = bisect_right(self._dates, end)
+        return self._dates[lo:hi]
+
+    def between(self, start, end):
+        """[(fecha, evento)] con start <= fecha <= end, en orden cronológico (series ya expandidas)."""
+        singles = [(d, e) for d in self._span(start, end) for e in self._days[d]]
+        repeated = self._occurrences(start, end)
+        if not repeated:
+            return singles
+        return list(merge(singles, repeated, key=itemgetter(0)))
+
+    def day_counts(self, start, end):
+        counts = {d: len(self._days[d]) for d in self._span(start, end)}
+        for d, _ in self._occurrences(start, end):
+            counts[d] = counts.get(d, 0) + 1
+        return counts
+
+    def get(self, event_id):
+        return self._by_id.get(event_id)
+
+    def first_date(self, event_id, start, end):
+        """Primera fecha del evento (o de la serie) dentro de [start, end], o None."""
+        if event_id in self._series:
+            first, rule, _ = self._series[event_id]
+            return rule.first(first, start, end)
+        d = self._where.get(event_id)
+        return d if d is not None and start <= d <= end else None
+
+    def search(self, query):
+        """ids cuyos títulos tienen, para cada palabra de la consulta, alguna palabra que empieza con ella."""
+        found = None
+        for q in title_tokens(query):
+            ids = set()
+            i = bisect_left(self._vocab, q)
+            while i < len(self._vocab) and self._vocab[i].startswith(q):
+                ids |= self._words[self._vocab[i]]
+                i += 1
+            found = ids if found is None else found & ids
+            if not found:
+                return set()
+        return found or set()
+
+
+# ---------------- Consultas usadas por la UI ----------------
+def events_on_day(index, d):
+    return index.on_day(d)
+
+def search_events(index, query, start, end):
+    """[(fecha, evento)] del rango [start, end], filtrados por título si hay consulta, en orden cronológico.
+
+    Una fila por evento: las series aparecen una vez, en su primera fecha dentro del rango.
+    """
+    if not (query or "").strip():
+        seen, hits = set(), []
+        for d, e in index.between(start, end):
+            if e["id"] not in seen:
+                seen.add(e["id"])
+                hits.append((d, e))
+        return hits
+    hits = []
+    for i in index.search(query):
+        d = index.first_date(i, start, end)
+        if d is not None:
+            hits.append((d, index.get(i)))
+    hits.sort(key=itemgetter(0))
+    return hits
+
+def upcoming_events(index, days=3, today=None):
+    today = today or date.today()
+    return [((d - today).days, e) for d, e in index.between(today, today + timedelta(days=days))]
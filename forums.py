@@ -0,0 +1,114 @@
+# forums.py - Foros anónimos compartidos (SQLite) con paginación por cursor y polling incremental
+import os, sqlite3, threading
+from datetime import datetime
+
+GROUPS = ["Bienestar y salud mental", "Apoyo entre compañeros", "Motivación y energía"]
+
+
+class ForumStore:
+    """Todos los estudiantes ven los mismos hilos. Los posts se leen por páginas usando el id como cursor."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS posts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        grp TEXT NOT NULL,
+        author TEXT NOT NULL,
+        created TEXT NOT NULL,
+        text TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS posts_grp_id ON posts (grp, id);
+    """
+
+    def __init__(self, path="forums.db"):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def post(self, group, text, author="Anónimo", when=None):
+        when = when or datetime.now()
+        with self._lock:
+            cur = self.conn.execute("INSERT INTO posts (grp, author, created, text) VALUES (?, ?, ?, ?)",
+                                    (group, author, when.isoformat(timespec="seconds"), text))
+            return cur.lastrowid
+
+    def _rows(self, sql, args):
+        with self._lock:
+            return [dict(r) for r in self.conn.execute(sql, args)]
+
+    def page(self, group, before=None, limit=20):
+        """Hasta `limit` posts anteriores al id `before` (o los más recientes), en orden cronológico."""
+        if before is None:
+            rows = self._rows("SELECT * FROM posts WHERE grp=? ORDER BY id DESC LIMIT ?", (group, limit))
+        else:
+            rows = self._rows("SELECT * FROM posts WHERE grp=? AND id<? ORDER BY id DESC LIMIT ?", (group, before, limit))
+        rows.reverse()
+        return rows
+
+    def since(self, group, last_id, limit=100):
+        """Posts nuevos desde `last_id` (polling incremental), en orden cronológico."""
+        return self._rows("SELECT * FROM posts WHERE grp=? AND id>? ORDER BY id LIMIT ?", (group, last_id, limit))
+
+    def has_before(self, group, before):
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM posts WHERE grp=? AND id<? LIMIT 1", (group, before)).fetchone() is not None
+
+
+class ForumView:
+    """Ventana de posts que guarda cada sesión: nunca más de `max_posts`, sin importar el largo del hilo.
+
+    En modo "live" se agregan los posts nuevos (since last_id) y se descartan los más viejos; al pedir
+    comentarios anteriores se pasa a modo historial (sin polling) hasta volver a lo más reciente.
+    """
+
+    def __init__(self, page_size=20, max_posts=100):
+        self.page_size = page_size
+        self.max_posts = max_posts
+        self.posts = []
+        self.last_id = None
+        self.live = True
+
+    def _trim(self, keep_newest=True):
+        extra = len(self.posts) - self.max_posts
+        if extra > 0:
+            self.posts = self.posts[extra:] if keep_newest else self.posts[:self.max_posts]
+
+    def refresh(self, store, group):
+        if not self.live:
+            return
+        if self.last_id is None:
+            self.posts = store.page(group, limit=self.page_size)
+        else:
+            new = store.since(group, self.last_id, limit=self.max_posts)
+            if len(new) == self.max_posts:
+                # quedamos muy atrás: basta con la última página
+                new = store.page(group, limit=self.page_size)
+                self.posts = []
+            self.posts.extend(new)
+            self._trim(keep_newest=True)
+        self.last_id = self.posts[-1]["id"] if self.posts else 0
+
+    def load_older(self, store, group):
+        if not self.posts:
+            return
+        self.live = False
+        self.posts = store.page(group, before=self.posts[0]["id"], limit=self.page_size) + self.posts
+        self._trim(keep_newest=False)
+
+    def back_to_latest(self):
+        self.posts, self.last_id, self.live = [], None, True
+
+    def has_older(self, store, group):
+        return bool(self.posts) and store.has_before(group, self.posts[0]["id"])
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_forum_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ForumStore(os.getenv("ANIMA_FORUM_DB", "forums.db"))
+        return _store
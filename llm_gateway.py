@@ -0,0 +1,188 @@
+# llm_gateway.py - Gateway del proceso hacia Groq: cliente compartido, tope de llamadas en vuelo,
+# token bucket, reintentos con backoff exponencial + jitter y unificación de prompts idénticos en vuelo
+import os, json, time, random, threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+
+from groq import Groq, APIConnectionError
+
+
+class GatewayError(Exception):
+    """La llamada no se pudo completar dentro de su plazo (rate limit local, reintentos agotados, timeout)."""
+
+
+class TokenBucket:
+    """Token bucket clásico: `rate` fichas por segundo, hasta `burst` acumuladas."""
+
+    def __init__(self, rate, burst, clock=time.monotonic, sleep=time.sleep):
+        self.rate = float(rate)
+        self.burst = float(burst)
+        self.tokens = float(burst)
+        self.clock = clock
+        self.sleep = sleep
+        self.stamp = clock()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def acquire(self, deadline=None):
+        """Toma una ficha esperando lo necesario; False si la espera pasaría del deadline."""
+        while True:
+            with self._lock:
+                now = self.clock()
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return True
+                wait = (1 - self.tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self.sleep(wait)
+
+
+def is_retryable(e):
+    if isinstance(e, APIConnectionError):  # incluye APITimeoutError
+        return True
+    status = getattr(e, "status_code", None)
+    return status in (408, 409, 429) or (status is not None and status >= 500)
+
+def retry_after(e):
+    response = getattr(e, "response", None)
+    try:
+        return float(response.headers.get("retry-after"))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+class LLMGateway:
+    def __init__(self, client, max_inflight=8, rate=5.0, burst=10, max_retries=4,
+                 base_delay=0.5, max_delay=8.0, timeout=30.0, clock=time.monotonic, sleep=time.sleep):
+        self.client = client
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.clock = clock
+        self.sleep = sleep
+        self.bucket = TokenBucket(rate, burst, clock=clock, sleep=sleep)
+        self._slots = threading.BoundedSemaphore(max_inflight)
+        self._pool = ThreadPoolExecutor(max_inflight, thread_name_prefix="anima-llm")
+        self._inflight = {}  # clave del prompt -> Future compartido
+        self._lock = threading.Lock()
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "coalesced": 0, "failures": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self.stats[name] += n
+
+    def backoff(self, attempt, hint=None):
+        # "full jitter": uniforme entre 0 y el tope exponencial; respeta Retry-After si viene
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, hint or 0)
+
+    def _attempts(self, call, deadline):
+        attempt = 0
+        while True:
+            if not self.bucket.acquire(deadline):
+                raise GatewayError("límite de solicitudes: no hubo cupo antes del plazo")
+            self._count("attempts")
+            try:
+                return call(max(0.1, deadline - self.clock()))
+            except Exception as e:
+                if not is_retryable(e) or attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt, retry_after(e))
+                if self.clock() + delay >= deadline:
+                    raise GatewayError(f"plazo agotado tras {attempt + 1} intento(s): {e}") from e
+                self._count("retries")
+                self.sleep(delay)
+                attempt += 1
+
+    def _guarded(self, call, deadline):
+        if not self._slots.acquire(timeout=max(0, deadline - self.clock())):
+            raise GatewayError("demasiadas llamadas en vuelo")
+        try:
+            return self._attempts(call, deadline)
+        except Exception:
+            self._count("failures")
+            raise
+        finally:
+            self._slots.release()
+
+    def complete(self, messages, model, timeout=None, **params):
+        """Respuesta completa (texto). Prompts idénticos en vuelo comparten una sola llamada."""
+        deadline = self.clock() + (timeout or self.timeout)
+        key = json.dumps([model, messages, params], sort_keys=True, ensure_ascii=False)
+
+        def call(remaining):
+            resp = self.client.chat.completions.create(model=model, messages=messages, timeout=remaining, **params)
+            return resp.choices[0].message.content
+
+        with self._lock:
+            self.stats["calls"] += 1
+            fut = self._inflight.get(key)
+            if fut is not None:
+                self.stats["coalesced"] += 1
+            else:
+                fut = self._pool.submit(self._guarded, call, deadline)
+                self._inflight[key] = fut
+                fut.add_done_callback(lambda f, k=key: self._forget(k, f))
+        try:
+            return fut.result(timeout=max(0, deadline - self.clock()))
+        except FutureTimeout:
+            raise GatewayError("la respuesta no llegó dentro del plazo") from None
+
+    def _forget(self, key, fut):
+        with self._lock:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def stream(self, messages, model, timeout=None, **params):
+        """Generador de fragmentos de texto. Se reintenta solo hasta abrir el stream; ocupa un cupo mientras dura."""
+        deadline = self.clock() + (timeout or self.timeout)
+        self._count("calls")
+        if not self._slots.acquire(timeout=max(0, deadline - self.clock())):
+            raise GatewayError("demasiadas llamadas en vuelo")
+        try:
+            try:
+                response = self._attempts(lambda remaining: self.client.chat.completions.create(
+                    model=model, messages=messages, stream=True, timeout=remaining, **params), deadline)
+                for chunk in response:
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        yield delta
+            except Exception:
+                self._count("failures")
+                raise
+        finally:
+            self._slots.release()
+
+
+_gateway = None
+_gateway_lock = threading.Lock()
+
+def get_gateway():
+    """Gateway compartido por todas las sesiones del proceso (el cliente Groq reusa su pool HTTP).
+
+    Si no hay cliente (sin GROQ_API_KEY), gateway.client queda en None y ANIMA responde en modo offline.
+    """
+    global _gateway
+    with _gateway_lock:
+        if _gateway is None:
+            try:
+                # los reintentos los maneja el gateway, no el SDK
+                client = Groq(api_key=os.getenv("GROQ_API_KEY"), max_retries=0)
+            except Exception:
+                client = None
+            _gateway = LLMGateway(
+                client,
+                max_inflight=int(os.getenv("ANIMA_LLM_MAX_INFLIGHT", "8")),
+                rate=float(os.getenv("ANIMA_LLM_RATE", "5")),
+                burst=int(os.getenv("ANIMA_LLM_BURST", "10")),
+                max_retries=int(os.getenv("ANIMA_LLM_RETRIES", "4")),
+                timeout=float(os.getenv("ANIMA_LLM_TIMEOUT", "30")),
+            )
+        return _gateway
@@ -0,0 +1,21 @@
+# locks.py - Lock exclusivo entre procesos (flock sobre un archivo .lock) y entre hilos del mismo proceso
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin lock entre procesos (el lock entre hilos sigue)
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, thread_lock):
+    """Toma `thread_lock` (flock no excluye hilos que comparten proceso) y después flock sobre `path`,
+    que se crea si no existe."""
+    with thread_lock, open(path, "a") as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
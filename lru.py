@@ -0,0 +1,30 @@
+# lru.py - LRU en memoria para resultados derivados (grillas del mes, carga académica) con la versión en la clave
+import threading
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class LRUCache:
+    """LRU de resultados ya calculados. La versión del store entra en la clave: cualquier cambio invalida solo."""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0}
+
+    def get(self, key, build):
+        with self._lock:
+            value = self._data.get(key, _MISSING)
+            if value is not _MISSING:
+                self._data.move_to_end(key)
+                self.stats["hits"] += 1
+                return value
+            self.stats["misses"] += 1
+        value = build()
+        with self._lock:
+            self._data[key] = value
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+        return value
@@ -0,0 +1,208 @@
+# metrics.py - Tiempos por fase de cada rerun, histogramas en proceso y export en formato Prometheus
+import os, time, random, threading, cProfile
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_local = threading.local()
+
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+TOKEN_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000)
+
+
+def size_class(n):
+    # la cantidad de eventos va como etiqueta por tramos, para no disparar la cardinalidad
+    for limit in (100, 1000, 10000):
+        if n < limit:
+            return f"<{limit}"
+    return ">=10000"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._series = {}  # labels (tupla ordenada) -> [conteos por bucket..., suma, total]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = [0] * (len(self.buckets) + 2)
+            if i < len(self.buckets):
+                s[i] += 1
+            s[-2] += value
+            s[-1] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v)) for k, v in sorted(self._series.items())]
+        for key, s in series:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+            sep = "," if base else ""
+            acc = 0
+            for le, n in zip(self.buckets, s):
+                acc += n
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="{le}"}} {acc}')
+            lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {s[-1]}')
+            lines.append(f"{self.name}_sum{{{base}}} {s[-2]:.6f}")
+            lines.append(f"{self.name}_count{{{base}}} {s[-1]}")
+        return "\n".join(lines)
+
+
+class Rerun:
+    """Una ejecución del script. Cada fase se mide con `with rerun.phase(nombre):` y se etiqueta con la
+    vista (menu_choice) y el tamaño del calendario conocidos en ese momento."""
+
+    def __init__(self, registry, profile=False):
+        self.registry = registry
+        self.view = ""
+        self.events = 0
+        self.start = time.perf_counter()
+        self.finished = False
+        self.profiler = None
+        # una rerun cortada por st.stop()/st.rerun() no llega a finish(): se apaga su profiler acá
+        leftover = getattr(_local, "profiler", None)
+        if leftover is not None:
+            leftover.disable()
+            _local.profiler = None
+        if profile:
+            try:
+                self.profiler = _local.profiler = cProfile.Profile()
+                self.profiler.enable()
+            except ValueError:  # otro profiler activo en este hilo
+                self.profiler = _local.profiler = None
+
+    def tag(self, view=None, events=None):
+        if view is not None:
+            self.view = view
+        if events is not None:
+            self.events = events
+
+    @contextmanager
+    def phase(self, name):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            # también se registra si la fase termina con st.stop()/st.rerun()
+            self.registry.phases.observe(time.perf_counter() - t0, phase=name, view=self.view, events=size_class(self.events))
+
+    def finish(self):
+        self.finished = True
+        total = time.perf_counter() - self.start
+        self.registry.reruns.observe(total, view=self.view, events=size_class(self.events))
+        if self.profiler is not None:
+            self.profiler.disable()
+            _local.profiler = None
+            if total * 1000 >= self.registry.profile_slow_ms:
+                self.registry.dump_profile(self.profiler, self.view, total)
+        self.registry.maybe_write_file()
+        return total
+
+
+class Registry:
+    def __init__(self, metrics_file=None, profile_rate=0.0, profile_slow_ms=500, profile_dir="profiles", write_every=10.0):
+        self.phases = Histogram("anima_phase_seconds", "Duración de cada fase de una rerun de ANIMA")
+        self.reruns = Histogram("anima_rerun_seconds", "Duración total de las reruns que llegan al final del script")
+        self.prompt_tokens = Histogram("anima_prompt_tokens", "Tokens estimados del contexto enviado al modelo por mensaje",
+                                       buckets=TOKEN_BUCKETS)
+        self.ttft = Histogram("anima_ttft_seconds", "Tiempo hasta el primer fragmento de la respuesta del chat")
+        self.reply = Histogram("anima_reply_seconds", "Tiempo total de la respuesta del chat")
+        self.metrics_file = metrics_file
+        self.profile_rate = profile_rate
+        self.profile_slow_ms = profile_slow_ms
+        self.profile_dir = profile_dir
+        self.write_every = write_every
+        self._last_write = 0.0
+        self._lock = threading.Lock()
+
+    def start_rerun(self):
+        return Rerun(self, profile=self.profile_rate > 0 and random.random() < self.profile_rate)
+
+    def observe_reply(self, prompt_tokens, ttft=None, total=None, streamed=True, cached=False):
+        """Métricas de un mensaje del chat (ttft/total solo existen con streaming)."""
+        labels = {"streamed": str(streamed).lower(), "cached": str(cached).lower()}
+        self.prompt_tokens.observe(prompt_tokens, **labels)
+        if ttft is not None:
+            self.ttft.observe(ttft, **labels)
+        if total is not None:
+            self.reply.observe(total, **labels)
+
+    def render(self):
+        return "\n".join(h.render() for h in (self.phases, self.reruns, self.prompt_tokens, self.ttft, self.reply)) + "\n"
+
+    def maybe_write_file(self, force=False):
+        if not self.metrics_file:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_write < self.write_every:
+                return
+            self._last_write = now
+        tmp = f"{self.metrics_file}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            fh.write(self.render())
+        os.replace(tmp, self.metrics_file)
+
+    def dump_profile(self, profiler, view, total):
+        os.makedirs(self.profile_dir, exist_ok=True)
+        safe_view = "".join(c if c.isalnum() else "_" for c in view) or "rerun"
+        profiler.dump_stats(os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{safe_view}-{int(total * 1000)}ms.prof"))
+
+    def serve(self, port, host="127.0.0.1"):
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path.rstrip("/") != "/metrics":
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        server = ThreadingHTTPServer((host, port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True, name="anima-metrics").start()
+        return server
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_registry():
+    """Registro del proceso. ANIMA_METRICS_FILE escribe el texto Prometheus a disco, ANIMA_METRICS_PORT lo sirve
+    en http://127.0.0.1:<port>/metrics y ANIMA_PROFILE_RATE (0-1) perfila una muestra de reruns con cProfile,
+    guardando solo las que superan ANIMA_PROFILE_SLOW_MS."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = Registry(
+                metrics_file=os.getenv("ANIMA_METRICS_FILE"),
+                profile_rate=float(os.getenv("ANIMA_PROFILE_RATE", "0")),
+                profile_slow_ms=float(os.getenv("ANIMA_PROFILE_SLOW_MS", "500")),
+                profile_dir=os.getenv("ANIMA_PROFILE_DIR", "profiles"),
+            )
+            port = os.getenv("ANIMA_METRICS_PORT")
+            if port:
+                try:
+                    _registry.serve(int(port))
+                except OSError:
+                    pass  # otro proceso ya expone el puerto
+        return _registry
+
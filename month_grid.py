@@ -0,0 +1,62 @@
+# month_grid.py - HTML de la vista mensual, memoizado por (usuario, año, mes, versión del store, color)
+import calendar
+from datetime import date
+
+from lru import LRUCache
+
+WEEKDAYS = ["Mon","Tue","Wed","Thu","Fri","Sat","Sun"]
+_HEADER = "<tr>" + "".join(f"<th style='text-align:left;padding:8px;color:#2B2B2B'>{wd}</th>" for wd in WEEKDAYS) + "</tr>"
+_EMPTY_CELL = "<td class='calendar-cell' style='height:90px;background:transparent'></td>"
+
+
+def month_matrix(year, month):
+    cal = calendar.Calendar(firstweekday=0)  # Monday=0? here Sunday=6; but we'll use default
+    weeks = cal.monthdayscalendar(year, month)
+    return weeks
+
+def shift_month(year, month, delta):
+    m = year * 12 + (month - 1) + delta
+    return m // 12, m % 12 + 1
+
+def month_html(index, year, month, default_color):
+    # mapping día -> eventos, solo del mes visible
+    last_day = calendar.monthrange(year, month)[1]
+    by_day = {}
+    for d, e in index.between(date(year, month, 1), date(year, month, last_day)):
+        by_day.setdefault(d.day, []).append(e)
+
+    out = [f"<div style='width:100%'><h3 style='margin-bottom:6px'>{calendar.month_name[month]} {year}</h3>",
+           "<table style='width:100%; border-collapse:collapse;'>", _HEADER]
+    for wk in month_matrix(year, month):
+        out.append("<tr>")
+        for day in wk:
+            if day == 0:
+                out.append(_EMPTY_CELL)
+                continue
+            out.append(f"<td class='calendar-cell' style='vertical-align:top; padding:8px; height:90px;'><div class='calendar-day-num'>{day}</div>")
+            evs = by_day.get(day)
+            if evs:
+                # show up to 2 event pills
+                for ev in evs[:2]:
+                    title_short = ev.get("title","").replace("<","").replace(">","")
+                    color = ev.get("color", default_color)
+                    out.append(f"<div class='event-pill' style='background:{color};color:#222;margin-top:4px;'>{title_short[:18]}</div>")
+                if len(evs) > 2:
+                    out.append(f"<div style='font-size:12px;color:#6b6b6b;margin-top:4px;'>+{len(evs)-2} more</div>")
+            out.append("</td>")
+        out.append("</tr>")
+    out.append("</table></div>")
+    return "".join(out)
+
+
+grid_cache = LRUCache()
+
+def cached_month_html(user, index, year, month, version, default_color, prefetch=True):
+    key = (user, year, month, version, default_color)
+    html = grid_cache.get(key, lambda: month_html(index, year, month, default_color))
+    if prefetch:
+        # deja listos el mes anterior y el siguiente para que la navegación sea instantánea
+        for delta in (-1, 1):
+            y, m = shift_month(year, month, delta)
+            grid_cache.get((user, y, m, version, default_color), lambda y=y, m=m: month_html(index, y, m, default_color))
+    return html
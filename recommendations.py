@@ -0,0 +1,55 @@
+# recommendations.py - Recomendaciones rápidas de ANIMA a partir del calendario y la encuesta
+from datetime import date, timedelta
+from events import upcoming_events
+from analytics import BUSY_WEEK, workload as build_workload
+from recurrence import WEEKDAY_NAMES
+from wellbeing import FALLING_SLOPE
+
+
+def _day(d):
+    return f"{WEEKDAY_NAMES[d.weekday()]} {d.day}"
+
+def smart_recommendations(index, survey, today=None, workload=None, upcoming=None):
+    """`workload` (analytics.Workload desde hoy) viene del caché por versión; si falta se calcula acá.
+    `upcoming` ([(días, evento)] del planificador de recordatorios) evita recorrer el calendario."""
+    recs = []
+    today = today or date.today()
+    load = workload if workload is not None else build_workload(index, today)
+    # upcoming 3 days
+    up = upcoming if upcoming is not None else upcoming_events(index, days=3, today=today)
+    if up:
+        for delta, e in up:
+            when = "hoy" if delta==0 else f"en {delta} día(s)"
+            recs.append(f"🔔 {when}: {e['title']}. {('Hora: ' + e.get('time')) if e.get('time') else ''}")
+    # overloaded days (coming week)
+    week = today + timedelta(days=7)
+    overloaded = load.overloaded(today, week)
+    if overloaded:
+        days = ", ".join(_day(d) for d in overloaded)
+        recs.append(f"⚠️ Noté días muy cargados esta semana ({days}). ANIMA sugiere incluir pausas de 10-15 minutos cada 90 minutos de estudio.")
+    # semana más cargada del horizonte, desde los conteos semanales del Workload
+    monday, busy = load.busiest_week()
+    if busy >= BUSY_WEEK:
+        when = "Esta semana" if monday <= today else f"La semana del {_day(monday)}"
+        recs.append(f"📅 {when} es la más cargada de las próximas seis ({busy} eventos): adelanta lo que puedas antes y deja espacio para descansar.")
+    # based on survey avg (if present)
+    if survey:
+        prom = survey.get("prom", None)
+        if prom is not None and prom < 4:
+            recs.append("💛 Tu encuesta indica baja energía. ANIMA recomienda planificar bloques más cortos de estudio y más descansos.")
+        slope = survey.get("slope")
+        if slope is not None and slope <= FALLING_SLOPE:
+            recs.append("📉 Tus últimas encuestas vienen a la baja. Date un respiro esta semana y, si lo necesitas, conversa con el equipo de bienestar.")
+    # evaluaciones de las próximas 2 semanas (categoría calculada en el frame, no título por título)
+    fortnight = today + timedelta(days=14)
+    if load.evaluations(today, fortnight):
+        recs.append("🧠 Tienes evaluaciones próximas: intenta programar repasos cortos y sueño reparador la noche anterior.")
+        peak, start = load.evaluation_peak(today, fortnight)
+        if peak >= 3:
+            recs.append(f"📚 Entre el {_day(start)} y el {_day(start + timedelta(days=6))} tienes {peak} evaluaciones: reparte el estudio desde ya, un ramo por bloque.")
+        gaps = load.free_gaps(today + timedelta(days=1), week)
+        if gaps:
+            first, last, n = gaps[0]
+            when = f"el {_day(first)}" if n == 1 else f"del {_day(first)} al {_day(last)}"
+            recs.append(f"🌿 Tienes libre {when}: buen momento para adelantar repasos o para descansar de verdad.")
+    return recs
@@ -0,0 +1,110 @@
+# recurrence.py - Reglas de repetición (diaria / semanal por días) guardadas una vez por serie
+#
+# Un evento con "recurrence" es una serie: su "date" es la primera fecha y la regla es
+#   {"freq": "daily"|"weekly", "interval": 1, "weekdays": [0, 2], "until": "2026-12-15", "count": 20,
+#    "except": ["2026-11-03"]}
+# Como en iCalendar, "count" cuenta las ocurrencias antes de quitar las fechas de "except".
+from datetime import date, datetime, timedelta
+
+FREQS = ("daily", "weekly")
+# una serie se expande a lo más esto desde el inicio de la ventana (o de la serie): sin "until" ni "count",
+# una ventana abierta (date.max) iteraría hasta el año 9999 y terminaría en OverflowError
+MAX_SPAN = timedelta(days=366 * 10)
+WEEKDAY_NAMES = ["Lun", "Mar", "Mié", "Jue", "Vie", "Sáb", "Dom"]
+
+
+def _as_date(v):
+    if v is None or v == "":
+        return None
+    if isinstance(v, date):
+        return v
+    return datetime.fromisoformat(v).date()
+
+
+class Rule:
+    __slots__ = ("freq", "interval", "weekdays", "until", "count", "exdates")
+
+    def __init__(self, spec, start):
+        self.freq = spec.get("freq", "weekly")
+        if self.freq not in FREQS:
+            raise ValueError(f"frecuencia no soportada: {self.freq}")
+        self.interval = max(1, int(spec.get("interval") or 1))
+        # por defecto la semanal repite el día de la semana de la primera fecha; la diaria no usa weekdays
+        self.weekdays = sorted(set(spec.get("weekdays") or [start.weekday()])) if self.freq == "weekly" else []
+        self.until = _as_date(spec.get("until"))
+        self.count = int(spec["count"]) if spec.get("count") else None
+        self.exdates = {_as_date(d) for d in spec.get("except", ())}
+
+    def occurrences(self, start, lo, hi):
+        """Fechas de la serie que empieza en `start` dentro de [lo, hi], en orden."""
+        return list(self._iter(start, lo, hi))
+
+    def first(self, start, lo, hi):
+        """Primera fecha de la serie dentro de [lo, hi], o None (sin expandir el resto)."""
+        return next(self._iter(start, lo, hi), None)
+
+    def _iter(self, start, lo, hi):
+        end = hi if self.until is None else min(hi, self.until)
+        try:
+            # margen de un paso antes de date.max: el generador suma un intervalo más antes de cortar
+            end = min(end, max(lo, start) + MAX_SPAN, date.max - timedelta(weeks=self.interval + 1))
+        except OverflowError:
+            end = min(end, date.max - timedelta(weeks=self.interval + 1))
+        if end < start or end < lo:
+            return iter(())
+        gen = self._daily(start, lo, end) if self.freq == "daily" else self._weekly(start, lo, end)
+        return (d for n, d in gen if (self.count is None or n < self.count) and d not in self.exdates)
+
+    def _daily(self, start, lo, end):
+        k = self.interval
+        n = max(0, -(-(lo - start).days // k))  # primer múltiplo de k que cae en la ventana
+        d = start + timedelta(days=n * k)
+        step = timedelta(days=k)
+        while d <= end and (self.count is None or n < self.count):
+            yield n, d
+            n += 1
+            d += step
+
+    def _weekly(self, start, lo, end):
+        k, days = self.interval, self.weekdays
+        week0 = start - timedelta(days=start.weekday())
+        first = [wd for wd in days if wd >= start.weekday()]  # la primera semana empieza en start
+        # salta directo a la primera semana activa que puede tocar la ventana
+        w = max(0, ((lo - week0).days // 7) // k * k)
+        n = len(first) + (w // k - 1) * len(days) if w else 0
+        while True:
+            monday = week0 + timedelta(weeks=w)
+            if monday > end or (self.count is not None and n >= self.count):
+                return
+            for wd in (first if w == 0 else days):
+                d = monday + timedelta(days=wd)
+                if d > end:
+                    return
+                if d >= lo:
+                    yield n, d
+                n += 1
+            w += k
+
+    def describe(self):
+        every = "cada día" if self.freq == "daily" else "cada semana"
+        if self.interval > 1:
+            every = f"cada {self.interval} días" if self.freq == "daily" else f"cada {self.interval} semanas"
+        text = every
+        if self.freq == "weekly":
+            text += " (" + ", ".join(WEEKDAY_NAMES[wd] for wd in self.weekdays) + ")"
+        if self.until:
+            text += f" hasta {self.until}"
+        if self.count:
+            text += f", {self.count} veces"
+        return text
+
+
+def rule_of(event):
+    """Rule de una serie, o None si el evento es simple (o la regla es inválida)."""
+    spec = event.get("recurrence")
+    if not spec:
+        return None
+    try:
+        return Rule(spec, _as_date(event.get("date")))
+    except (TypeError, ValueError):
+        return None
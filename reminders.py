@@ -0,0 +1,272 @@
+# reminders.py - Planificador de recordatorios en segundo plano para todos los usuarios
+#
+# Un hilo lee una vez los calendarios de todos los usuarios (store.list_users()), deja en una cola de
+# prioridad (heap) cada ocurrencia próxima con la hora en que hay que avisar, y se actualiza en forma
+# incremental cuando el store confirma un cambio (UserStore.subscribe). La UI solo lee la lista ya armada
+# de cada usuario (upcoming) y las notificaciones van a un "sink" intercambiable.
+import heapq, itertools, os, threading
+from datetime import datetime, time, timedelta
+from operator import itemgetter
+
+from events import parse_date
+from recurrence import rule_of
+
+ALL_DAY_AT = time(8, 0)  # eventos sin hora: se avisa ese día a las 8:00
+
+
+# ---------------- Sinks ----------------
+class InboxSink:
+    """Deja los avisos por usuario; la app los muestra (st.toast) cuando el estudiante tiene la app abierta."""
+
+    def __init__(self, max_per_user=20):
+        self.max_per_user = max_per_user
+        self._inbox = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, reminder):
+        with self._lock:
+            box = self._inbox.setdefault(reminder["user"], [])
+            box.append(reminder)
+            del box[:-self.max_per_user]
+
+    def pop(self, user):
+        with self._lock:
+            return self._inbox.pop(user, [])
+
+
+class MemorySink:
+    """Guarda todo lo enviado (para pruebas y benchmarks)."""
+
+    def __init__(self):
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def __call__(self, reminder):
+        with self._lock:
+            self.sent.append(reminder)
+
+
+def _remind_times(d, e, lead):
+    """(hora de aviso, hora del evento): sin hora, se avisa a las ALL_DAY_AT y el evento dura todo el día."""
+    t = e.get("time") or ""
+    try:
+        hh, mm = (int(x) for x in t.split(":"))
+        starts = datetime.combine(d, time(hh, mm))
+        return starts - lead, starts
+    except ValueError:
+        return datetime.combine(d, ALL_DAY_AT), datetime.combine(d, time.max)
+
+
+class ReminderScheduler:
+    """Ocurrencias de los próximos `days` días de todos los usuarios.
+
+    Por usuario guarda todos sus eventos válidos (también los que hoy no caen en la ventana, para que el cambio
+    de día los pueda sumar), {id: [fechas en la ventana]} y la lista ordenada que lee la UI; el heap tiene
+    (hora de aviso, seq, usuario, id, fecha, generación, hora del evento) y las entradas de una versión vieja
+    de un evento se descartan al salir (cada cambio sube la generación del evento). Un evento que ya pasó no
+    se avisa: al reiniciar el proceso no se repiten los avisos de lo que ocurrió más temprano ese día.
+    """
+
+    def __init__(self, store, sink=None, days=3, lead_minutes=60, resync_seconds=300, clock=datetime.now):
+        self.store = store
+        self.sink = sink if sink is not None else InboxSink()
+        self.days = days
+        self.lead = timedelta(minutes=lead_minutes)
+        self.resync_seconds = resync_seconds
+        self.clock = clock
+        self.today = None
+        self._events = {}    # user -> {id: evento}, estén o no en la ventana
+        self._window = {}    # user -> {id: [fechas]}
+        self._upcoming = {}  # user -> [(fecha, evento)] ordenada (se arma al leer, si cambió)
+        self._versions = {}  # user -> versión del store ya cargada
+        self._gen = {}       # (user, id) -> generación
+        self._heap = []
+        self._seq = itertools.count()
+        self._sent = set()   # (user, id, fecha) ya avisados
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_sync = None
+
+    # ---------- carga ----------
+    def load_all(self):
+        for user in self.store.list_users():
+            self.refresh_user(user, self.store.load(user))
+
+    def refresh_user(self, user, data):
+        """Reemplaza todo lo del usuario (carga inicial, resync o guardado que tuvo que mezclar)."""
+        with self._lock:
+            self._roll_day()
+            for eid in self._window.pop(user, {}):
+                self._bump(user, eid)
+            self._events[user] = {}
+            self._window[user] = {}
+            for e in data.get("events", []):
+                self._put(user, e)
+            self._upcoming.pop(user, None)
+            self._versions[user] = data.get("version", 0)
+        self._wake.set()
+
+    def on_commit(self, user, data, upserts, deletes, merged):
+        """Suscriptor de UserStore: solo recalcula los eventos que cambiaron."""
+        if merged:
+            self.refresh_user(user, data)
+            return
+        with self._lock:
+            self._roll_day()
+            self._events.setdefault(user, {})
+            self._window.setdefault(user, {})
+            for eid in deletes:
+                self._drop(user, eid)
+            for e in upserts:
+                self._drop(user, e["id"])
+                self._put(user, e)
+            self._upcoming.pop(user, None)
+            self._versions[user] = data.get("version", 0)
+        self._wake.set()
+
+    # ---------- ventana + heap (con el lock tomado) ----------
+    def _bump(self, user, eid):
+        key = (user, eid)
+        self._gen[key] = self._gen.get(key, 0) + 1
+        return self._gen[key]
+
+    def _drop(self, user, eid):
+        self._events[user].pop(eid, None)
+        if self._window[user].pop(eid, None) is not None:
+            self._bump(user, eid)
+
+    def _put(self, user, e):
+        eid = e.get("id")
+        try:
+            first = parse_date(e.get("date"))
+        except ValueError:
+            return
+        if eid is None or first is None:
+            return
+        e = dict(e)  # copia: la sesión edita sus dicts en el lugar antes de guardar
+        self._events[user][eid] = e
+        self._expand(user, eid, e, first)
+
+    def _expand(self, user, eid, e, first):
+        end = self.today + timedelta(days=self.days)
+        rule = rule_of(e)
+        dates = rule.occurrences(first, self.today, end) if rule is not None else (
+            [first] if self.today <= first <= end else [])
+        if not dates:
+            return
+        self._window[user][eid] = dates
+        gen = self._bump(user, eid)
+        now = self.clock()
+        for d in dates:
+            at, starts = _remind_times(d, e, self.lead)
+            if starts >= now:
+                heapq.heappush(self._heap, (at, next(self._seq), user, eid, d, gen, starts))
+
+    def _roll_day(self):
+        # cambio de día: la ventana se corre y se rearma desde todos los eventos en memoria (incluye los que
+        # recién entran a la ventana)
+        today = self.clock().date()
+        if today == self.today:
+            return
+        self.today = today
+        self._heap = []
+        self._sent = {k for k in self._sent if k[2] >= today}
+        for user, events in self._events.items():
+            self._window[user] = {}
+            for eid, e in events.items():
+                self._expand(user, eid, e, parse_date(e.get("date")))
+            self._upcoming.pop(user, None)
+
+    # ---------- lectura para la UI ----------
+    def upcoming(self, user, days=None, today=None):
+        """[(días que faltan, evento)] como events.upcoming_events, sin recorrer el calendario."""
+        today = today or self.clock().date()
+        days = self.days if days is None else days
+        with self._lock:
+            self._roll_day()
+            rows = self._upcoming.get(user)
+            if rows is None:
+                rows = sorted(((d, self._events[user][eid]) for eid, ds in self._window.get(user, {}).items() for d in ds),
+                              key=itemgetter(0))
+                self._upcoming[user] = rows
+        return [((d - today).days, e) for d, e in rows if 0 <= (d - today).days <= days]
+
+    def knows(self, user):
+        with self._lock:
+            return user in self._window
+
+    # ---------- envío ----------
+    def fire_due(self):
+        """Envía al sink los avisos vencidos; devuelve la hora del próximo (o None)."""
+        now = self.clock()
+        due = []
+        with self._lock:
+            self._roll_day()
+            while self._heap and self._heap[0][0] <= now:
+                at, _, user, eid, d, gen, starts = heapq.heappop(self._heap)
+                if self._gen.get((user, eid)) != gen or (user, eid, d) in self._sent or starts < now:
+                    continue
+                self._sent.add((user, eid, d))
+                due.append({"user": user, "event": self._events[user][eid], "date": d, "at": at})
+            next_at = self._heap[0][0] if self._heap else None
+        for reminder in due:
+            try:
+                self.sink(reminder)
+            except Exception:
+                pass  # un sink que falla no detiene al planificador
+        return next_at
+
+    def resync(self):
+        """Trae los usuarios cuya versión cambió en otro proceso (o que se crearon)."""
+        for user in self.store.list_users():
+            if self.store.version(user) != self._versions.get(user):
+                self.refresh_user(user, self.store.load(user))
+
+    # ---------- hilo ----------
+    def _run(self):
+        self.load_all()
+        self._last_sync = self.clock()
+        while not self._stop.is_set():
+            next_at = self.fire_due()
+            now = self.clock()
+            if (now - self._last_sync).total_seconds() >= self.resync_seconds:
+                self.resync()
+                self._last_sync = now
+            midnight = datetime.combine(now.date() + timedelta(days=1), time())
+            wait = min((midnight - now).total_seconds(), self.resync_seconds)
+            if next_at is not None:
+                wait = min(wait, (next_at - now).total_seconds())
+            self._wake.wait(max(0.0, wait))
+            self._wake.clear()
+
+    def start(self):
+        self.store.subscribe(self.on_commit)
+        self._thread = threading.Thread(target=self._run, daemon=True, name="anima-reminders")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler(store):
+    """Planificador del proceso (ANIMA_REMINDERS=0 lo apaga). ANIMA_REMINDER_LEAD: minutos de anticipación
+    para eventos con hora; ANIMA_REMINDER_DAYS: días que se miran hacia adelante."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None and os.getenv("ANIMA_REMINDERS", "1") != "0":
+            _scheduler = ReminderScheduler(
+                store,
+                days=int(os.getenv("ANIMA_REMINDER_DAYS", "3")),
+                lead_minutes=int(os.getenv("ANIMA_REMINDER_LEAD", "60")),
+                resync_seconds=int(os.getenv("ANIMA_REMINDER_RESYNC", "300")),
+            ).start()
+        return _scheduler
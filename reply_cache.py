@@ -0,0 +1,136 @@
+# reply_cache.py - Caché de respuestas de ANIMA: LRU en memoria con TTL + nivel opcional en disco (SQLite)
+import os, re, time, json, hashlib, sqlite3, threading, unicodedata
+from collections import OrderedDict
+
+
+def normalize_prompt(text):
+    """Minúsculas, sin tildes, sin signos y con espacios colapsados: "¡Estoy  ESTRESADO!" == "estoy estresado"."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    text = re.sub(r"[^\w\s]", " ", text)
+    return " ".join(text.split())
+
+def cache_key(prompt, system_instruction, model):
+    raw = json.dumps([model, system_instruction, normalize_prompt(prompt)], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class DiskTier:
+    """Nivel compartido entre procesos: una tabla SQLite (key, value, expires).
+
+    Acotada: un expirado se borra al leerlo y cada `prune_every` escrituras se borran todos los expirados y,
+    si quedan más de `max_rows`, los que vencen antes (los más viejos, porque el TTL es el mismo para todos).
+    """
+
+    def __init__(self, path, max_rows=10000, prune_every=200):
+        self.max_rows = max_rows
+        self.prune_every = prune_every
+        self._puts = 0
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=10)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("CREATE TABLE IF NOT EXISTS replies (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS replies_expires ON replies (expires)")
+
+    def get(self, key, now):
+        with self._lock:
+            row = self.conn.execute("SELECT value, expires FROM replies WHERE key=?", (key,)).fetchone()
+            if row is None:
+                return None
+            if row[1] <= now:
+                # otro proceso pudo reescribirla entre medio: solo se borra si sigue vencida
+                self.conn.execute("DELETE FROM replies WHERE key=? AND expires<=?", (key, now))
+                return None
+        return row[0], row[1]
+
+    def put(self, key, value, expires, now=None):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO replies (key, value, expires) VALUES (?, ?, ?)", (key, value, expires))
+            self._puts += 1
+            if self._puts % self.prune_every == 0:
+                self._prune(time.time() if now is None else now)
+
+    def _prune(self, now):
+        self.conn.execute("DELETE FROM replies WHERE expires<=?", (now,))
+        extra = self.conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0] - self.max_rows
+        if extra > 0:
+            self.conn.execute("DELETE FROM replies WHERE key IN (SELECT key FROM replies ORDER BY expires LIMIT ?)", (extra,))
+
+    def __len__(self):
+        with self._lock:
+            return self.conn.execute("SELECT COUNT(*) FROM replies").fetchone()[0]
+
+
+class ReplyCache:
+    """LRU con TTL. stats cuenta hits/misses/evictions (más expirados, hits de disco y bypass)."""
+
+    def __init__(self, max_entries=512, ttl=6 * 3600, disk=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk = disk
+        self.clock = clock
+        self._data = OrderedDict()  # key -> (respuesta, expira)
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "expired": 0, "bypass": 0}
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key):
+        now = self.clock()
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None:
+                if item[1] > now:
+                    self._data.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return item[0]
+                del self._data[key]
+                self.stats["expired"] += 1
+        if self.disk is not None:
+            found = self.disk.get(key, now)
+            if found is not None:
+                with self._lock:
+                    self.stats["disk_hits"] += 1
+                    self._store(key, found[0], found[1])
+                return found[0]
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def put(self, key, value):
+        now = self.clock()
+        expires = now + self.ttl
+        with self._lock:
+            self._store(key, value, expires)
+        if self.disk is not None:
+            self.disk.put(key, value, expires, now)
+
+    def _store(self, key, value, expires):
+        self._data[key] = (value, expires)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def note_bypass(self):
+        with self._lock:
+            self.stats["bypass"] += 1
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_reply_cache():
+    """Caché compartida del proceso. ANIMA_CACHE_DB activa el nivel en disco (ANIMA_CACHE_DB_ROWS filas como
+    máximo); ANIMA_CACHE_SIZE=0 la desactiva."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            size = int(os.getenv("ANIMA_CACHE_SIZE", "512"))
+            if size > 0:
+                path = os.getenv("ANIMA_CACHE_DB")
+                _cache = ReplyCache(size, ttl=float(os.getenv("ANIMA_CACHE_TTL", str(6 * 3600))),
+                                    disk=DiskTier(path, max_rows=int(os.getenv("ANIMA_CACHE_DB_ROWS", "10000")))
+                                    if path else None)
+        return _cache
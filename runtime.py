@@ -0,0 +1,18 @@
+# runtime.py - Ajustes del intérprete para el proceso del servidor (una vez, al cargar la app)
+import gc, os, threading
+
+_frozen = False
+_lock = threading.Lock()
+
+def freeze_startup_heap():
+    """Congela (gc.freeze) lo que ya existe al cargar la app: módulos de pandas, altair, groq, streamlit...
+    Streamlit hace gc.collect(2) al terminar cada rerun (runner.postScriptGC) y sin esto recorre esos ~130k
+    objetos en cada clic (~90 ms de CPU); congelados, la colección solo mira lo creado después. Una vez por
+    proceso; ANIMA_GC_FREEZE=0 lo desactiva."""
+    global _frozen
+    with _lock:
+        if _frozen or os.getenv("ANIMA_GC_FREEZE", "1") == "0":
+            return
+        _frozen = True
+        gc.collect()
+        gc.freeze()
@@ -0,0 +1,97 @@
+# screening.py - Detección local de mensajes de riesgo (antes de llamar al modelo) con un léxico configurable
+#
+# El léxico es {categoría: [términos]}; cada término calza como prefijo de palabra sobre el texto en
+# minúsculas y sin tildes ("suicid" -> "suicidio", "no puedo mas" -> "No puedo... ¡más!").
+# ANIMA_RISK_LEXICON apunta a un JSON con el mismo formato: sus categorías reemplazan a las de fábrica.
+import json, os, re, threading, unicodedata
+
+DEFAULT_LEXICON = {
+    # angustia severa / pensamientos de riesgo (criterios de la instrucción de sistema)
+    # los términos son prefijos: "morir" cubre "morirme"/"morirse", "matar" cubre "matarme"
+    "crisis": ["suicid", "matar", "morir", "quitarme la vida", "no quiero vivir", "no quiero seguir", "hacerme dano",
+               "hago dano", "autolesion", "cortarme", "desaparecer", "no puedo mas", "no aguanto", "desesperad"],
+    "angustia": ["crisis", "panico", "ataque de ansiedad"],
+    # pide ayuda profesional explícita
+    "ayuda": ["psicolog", "psiquiatr", "ayuda profesional", "terapia", "especialista"],
+    # no es riesgo: evaluaciones en los títulos del calendario (analytics / recomendaciones)
+    "evaluacion": ["prueba", "certamen", "examen", "entrega", "control", "quiz", "solemne", "interrogacion"],
+}
+RISK_CATEGORIES = ("crisis", "angustia", "ayuda")
+
+
+def fold(text):
+    """Minúsculas y sin tildes, todo en C: NFD separa la tilde y el encode ascii la descarta ("Daño" -> "dano")."""
+    return unicodedata.normalize("NFD", text.casefold()).encode("ascii", "ignore").decode("ascii")
+
+def _trie_regex(terms):
+    """Alternativa con prefijos comunes factorizados ("psicolog|psiquiatr" -> "psi(?:colog|quiatr)"),
+    así el regex decide por el primer carácter en vez de probar término por término."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for ch in term:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        if list(node) == [""]:
+            return ""
+        optional = "" in node
+        alts = [(r"\W+" if ch == " " else re.escape(ch)) + emit(child) for ch, child in sorted(node.items()) if ch]
+        body = alts[0] if len(alts) == 1 and not optional else "(?:" + "|".join(alts) + ")"
+        return body + "?" if optional else body
+
+    return emit(trie)
+
+
+class Matcher:
+    """Regex precompilados sobre el léxico. El de riesgo junta todas sus categorías en un solo trie sin grupos
+    con nombre (lo más rápido para `re`); la categoría se averigua después, solo cuando hay coincidencia."""
+
+    def __init__(self, lexicon=None, risk_categories=RISK_CATEGORIES):
+        self.lexicon = {cat: sorted({" ".join(fold(t).split()) for t in terms if t.strip()})
+                        for cat, terms in (lexicon or DEFAULT_LEXICON).items()}
+        self.risk_categories = tuple(c for c in risk_categories if self.lexicon.get(c))
+        self.patterns = {cat: r"\b" + _trie_regex(terms) for cat, terms in self.lexicon.items() if terms}
+        self._by_category = {cat: re.compile(p) for cat, p in self.patterns.items()}
+        risk_terms = [t for cat in self.risk_categories for t in self.lexicon[cat]]
+        self._risk = re.compile(r"\b" + _trie_regex(risk_terms) if risk_terms else r"(?!)")
+
+    def match(self, text):
+        """(categoría, texto normalizado encontrado) del primer indicio de riesgo, o None."""
+        text = fold(text)
+        m = self._risk.search(text)
+        if m is None:
+            return None
+        cat = next(c for c in self.risk_categories if self._by_category[c].match(text, m.start()))
+        return cat, m.group()
+
+    def is_risky(self, text):
+        return self._risk.search(fold(text)) is not None
+
+    def categories(self, text):
+        text = fold(text)
+        return {cat for cat, rx in self._by_category.items() if rx.search(text)}
+
+    def pattern(self, category):
+        """Regex de una categoría sobre texto normalizado (para usarlo vectorizado con pandas)."""
+        return self.patterns[category]
+
+
+def load_lexicon(path=None):
+    lexicon = dict(DEFAULT_LEXICON)
+    if path:
+        with open(path, encoding="utf-8") as fh:
+            lexicon.update(json.load(fh))
+    return lexicon
+
+
+_matcher = None
+_matcher_lock = threading.Lock()
+
+def get_matcher():
+    global _matcher
+    with _matcher_lock:
+        if _matcher is None:
+            _matcher = Matcher(load_lexicon(os.getenv("ANIMA_RISK_LEXICON")))
+        return _matcher
@@ -0,0 +1,480 @@
+# storage.py - Persistencia por usuario de ANIMA (backend SQLite transaccional o JSON legado)
+#
+# Cada usuario tiene un número de versión. Un commit solo se aplica si la versión guardada sigue siendo la
+# que se leyó (compare-and-swap). Si otra pestaña u otro proceso escribió antes, el backend — todavía con el
+# lock de escritura tomado — lee lo nuevo y el store le aplica encima sus propios cambios (por evento y por
+# clave de prefs) antes de escribir. Nadie pisa lo que no tocó y no hay reintentos que puedan morir de hambre.
+import os, json, sqlite3, threading, time, uuid
+
+from locks import file_lock
+
+
+# ---------------- Helpers ----------------
+def user_file(username):
+    safe = username.replace(" ", "_")
+    return f"calendar_{safe}.json"
+
+def new_event_id():
+    return uuid.uuid4().hex[:12]
+
+def _dump(obj):
+    # serialización canónica: sirve para guardar y para comparar las prefs con las guardadas
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True)
+
+def _empty():
+    return {"events": [], "prefs": {}, "version": 0}
+
+_MISSING = object()
+
+
+class ConflictError(Exception):
+    """Otro escritor guardó una versión más nueva que la que se leyó."""
+
+    def __init__(self, expected, current):
+        super().__init__(expected, current)
+        self.expected = expected
+        self.current = current
+
+    def __str__(self):
+        return f"versión {self.expected} desactualizada (actual: {self.current})"
+
+
+class UserData(dict):
+    """Dict de usuario ({"events", "prefs", "version"}) con lo justo para saber qué falta persistir.
+
+    Los eventos cambian por add_event/update_event/delete_event, que guardan al tiro: no se guarda una copia
+    serializada de cada evento para compararla en cada rerun. Un evento editado directamente en
+    data["events"] se marca con touch(id); reemplazar o alargar la lista por fuera del store hace que el
+    próximo save compare los ids completos.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.saved_prefs = None  # prefs guardadas, serializadas
+        self.saved_ids = set()   # ids de eventos guardados
+        self.dirty = set()       # ids marcados con touch() (o sin id fijo todavía)
+        self.positions = {}      # id -> posición en self["events"], para editar/borrar en O(1)
+        self._events = None      # la lista que mantiene el store (para notar si la reemplazaron)
+
+    def mark_clean(self):
+        self.saved_prefs = _dump(self.get("prefs", {}))
+        self.saved_ids = {e["id"] for e in self.get("events", [])}
+        self.dirty = set()
+        self._events = self.get("events")
+
+    def touch(self, event_id):
+        """El evento se editó en el lugar: el próximo save lo guarda."""
+        self.dirty.add(event_id)
+
+    def tracked(self):
+        """True si la lista de eventos solo cambió por el store (más los ids marcados con touch)."""
+        events = self.get("events")
+        return events is self._events and len(events) == len(self.positions)
+
+
+# ---------------- Backends ----------------
+class JsonBackend:
+    """Un archivo calendar_<user>.json por usuario.
+
+    Cada commit toma un lock exclusivo (flock sobre calendar_<user>.json.lock), compara la versión del
+    archivo con la esperada y reescribe en un temporal propio + fsync + os.replace: un lector ve el archivo
+    viejo o el nuevo, nunca uno a medio escribir.
+    """
+
+    name = "json"
+
+    def __init__(self, directory="."):
+        self.directory = directory
+        self._lock = threading.Lock()
+
+    def path(self, username):
+        return os.path.join(self.directory, user_file(username))
+
+    def locked(self, username):
+        return file_lock(f"{self.path(username)}.lock", self._lock)
+
+    def _read(self, f):
+        try:
+            with open(f, "r", encoding="utf-8") as fh:
+                return json.load(fh)
+        except FileNotFoundError:
+            return None
+
+    def load(self, username):
+        f = self.path(username)
+        try:
+            return self._read(f)
+        except ValueError:
+            # archivo dañado (p. ej. escrito por una versión anterior sin rename atómico): se aparta en vez
+            # de tratarlo como calendario vacío y pisarlo en el próximo guardado
+            with self.locked(username):
+                try:
+                    return self._read(f)
+                except ValueError:
+                    os.replace(f, f"{f}.corrupt-{time.strftime('%Y%m%d-%H%M%S')}")
+                    return None
+
+    def commit(self, username, data, expected, prefs=None, upserts=None, deletes=None, on_conflict=None):
+        f = self.path(username)
+        with self.locked(username):
+            try:
+                current = self._read(f) or _empty()
+            except ValueError:
+                current = None
+            if current is not None and current.get("version", 0) != expected:
+                if on_conflict is None:
+                    raise ConflictError(expected, current.get("version", 0))
+                on_conflict(current)  # deja en `data` lo guardado + los cambios propios
+                expected = current.get("version", 0)
+            doc = {"events": data.get("events", []), "prefs": data.get("prefs", {}), "version": expected + 1}
+            tmp = f"{f}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as fh:
+                json.dump(doc, fh, ensure_ascii=False, indent=4)
+                fh.flush()
+                os.fsync(fh.fileno())
+            os.replace(tmp, f)
+
+    def version(self, username):
+        try:
+            return (self._read(self.path(username)) or {}).get("version", 0)
+        except ValueError:
+            return None
+
+    def list_users(self):
+        out = []
+        for name in os.listdir(self.directory):
+            if name.startswith("calendar_") and name.endswith(".json"):
+                out.append(name[len("calendar_"):-len(".json")])
+        return sorted(out)
+
+
+class SqliteBackend:
+    """Base SQLite embebida (WAL). Cada commit escribe solo las filas que cambiaron, en una transacción."""
+
+    name = "sqlite"
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS users (
+        user TEXT PRIMARY KEY,
+        prefs TEXT NOT NULL DEFAULT '{}',
+        version INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE TABLE IF NOT EXISTS events (
+        user TEXT NOT NULL,
+        id TEXT NOT NULL,
+        date TEXT,
+        payload TEXT NOT NULL,
+        PRIMARY KEY (user, id)
+    );
+    CREATE INDEX IF NOT EXISTS events_user_date ON events (user, date);
+    """
+
+    def __init__(self, path="anima.db", legacy_dir="."):
+        self.path = path
+        self.legacy_dir = legacy_dir
+        self._lock = threading.Lock()
+        self._readers = threading.local()
+        # Streamlit atiende cada sesión en un hilo distinto: una conexión compartida protegida por lock para
+        # escribir; las lecturas usan una conexión por hilo (WAL deja leer mientras otro escribe)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _reader(self):
+        conn = getattr(self._readers, "conn", None)
+        if conn is None:
+            conn = self._readers.conn = sqlite3.connect(self.path, isolation_level=None, timeout=30)
+        return conn
+
+    def _read(self, username, conn=None):
+        conn = conn or self.conn
+        # una sola transacción de lectura (versión y eventos consistentes) y un solo json.loads para la lista;
+        # dentro de commit/_migrate ya hay una transacción abierta
+        own = not conn.in_transaction
+        if own:
+            conn.execute("BEGIN")
+        try:
+            row = conn.execute("SELECT prefs, version FROM users WHERE user=?", (username,)).fetchone()
+            if row is None:
+                return None
+            payloads = [p for (p,) in conn.execute("SELECT payload FROM events WHERE user=? ORDER BY rowid", (username,))]
+        finally:
+            if own:
+                conn.execute("COMMIT")
+        return {"events": json.loads("[" + ",".join(payloads) + "]"), "prefs": json.loads(row[0]), "version": row[1]}
+
+    def load(self, username):
+        found = self._read(username, self._reader())
+        if found is not None:
+            return found
+        with self._lock:
+            found = self._read(username)
+            return found if found is not None else self._migrate(username)
+
+    def _migrate(self, username):
+        # primera carga: importa calendar_<user>.json si existe (llamado con el lock tomado)
+        legacy = JsonBackend(self.legacy_dir).load(username)
+        if legacy is None:
+            return None
+        events = legacy.get("events", [])
+        for e in events:
+            e.setdefault("id", new_event_id())
+        prefs = legacy.get("prefs", {})
+        c = self.conn
+        c.execute("BEGIN IMMEDIATE")
+        try:
+            found = self._read(username)
+            if found is not None:  # otro proceso migró primero
+                c.execute("COMMIT")
+                return found
+            c.execute("INSERT INTO users (user, prefs, version) VALUES (?, ?, 1)", (username, _dump(prefs)))
+            c.executemany("INSERT OR REPLACE INTO events (user, id, date, payload) VALUES (?, ?, ?, ?)",
+                          [(username, e["id"], e.get("date"), _dump(e)) for e in events])
+            c.execute("COMMIT")
+        except Exception:
+            c.execute("ROLLBACK")
+            raise
+        return {"events": events, "prefs": prefs, "version": 1}
+
+    def commit(self, username, data, expected, prefs=None, upserts=None, deletes=None, on_conflict=None):
+        with self._lock:
+            c = self.conn
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.execute("INSERT OR IGNORE INTO users (user) VALUES (?)", (username,))
+                # compare-and-swap: BEGIN IMMEDIATE ya excluye a otros escritores (también de otros procesos)
+                if c.execute("UPDATE users SET version=? WHERE user=? AND version=?",
+                             (expected + 1, username, expected)).rowcount == 0:
+                    current = self._read(username)
+                    if on_conflict is None:
+                        raise ConflictError(expected, current["version"])
+                    prefs = on_conflict(current)
+                    c.execute("UPDATE users SET version=? WHERE user=?", (current["version"] + 1, username))
+                if prefs is not None:
+                    c.execute("UPDATE users SET prefs=? WHERE user=?", (prefs, username))
+                if upserts:
+                    c.executemany("INSERT OR REPLACE INTO events (user, id, date, payload) VALUES (?, ?, ?, ?)",
+                                  [(username, e["id"], e.get("date"), payload) for e, payload in upserts])
+                if deletes:
+                    c.executemany("DELETE FROM events WHERE user=? AND id=?", [(username, i) for i in deletes])
+                c.execute("COMMIT")
+            except Exception:
+                c.execute("ROLLBACK")
+                raise
+
+    def version(self, username):
+        with self._lock:
+            row = self.conn.execute("SELECT version FROM users WHERE user=?", (username,)).fetchone()
+        return row[0] if row else 0
+
+    def list_users(self):
+        with self._lock:
+            return [u for (u,) in self.conn.execute("SELECT user FROM users ORDER BY user")]
+
+
+# ---------------- Store ----------------
+class UserStore:
+    """Fachada sobre un backend: carga, guardado con dirty tracking y operaciones de un solo evento."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._listeners = []
+
+    def subscribe(self, listener):
+        """listener(username, data, eventos guardados, ids borrados, merged) después de cada commit.
+        merged=True: el guardado tuvo que mezclar cambios de otro escritor (conviene releer todo `data`)."""
+        self._listeners.append(listener)
+
+    def load(self, username):
+        raw = self.backend.load(username) or _empty()
+        data = UserData(raw)
+        self._reset(data)
+        return data
+
+    def _reset(self, data):
+        data.setdefault("events", [])
+        data.setdefault("prefs", {})
+        data.setdefault("version", 0)
+        missing = []
+        for e in data["events"]:
+            if "id" not in e:
+                e["id"] = new_event_id()
+                missing.append(e["id"])
+        data.mark_clean()
+        data.positions = {e["id"]: i for i, e in enumerate(data["events"])}
+        # eventos legados sin id: quedan "sucios" para que el próximo save fije su id
+        data.dirty.update(missing)
+        data.saved_ids.difference_update(missing)
+
+    def _rebase(self, data, fresh, prefs, upserts, deletes):
+        """Aplica los cambios propios sobre lo guardado (`fresh`), en el mismo dict `data`.
+
+        Eventos: gana la versión propia de los que se tocaron. Prefs: se aplican solo las claves que cambiaron
+        desde la carga. Devuelve las prefs a guardar (serializadas) o None si no hay cambios de prefs.
+        """
+        mine = {e["id"]: e for e, _ in upserts}
+        deleted = set(deletes)
+        events = [mine.pop(e["id"], e) for e in fresh.get("events", []) if e.get("id") not in deleted]
+        events.extend(e for e in data.get("events", []) if e["id"] in mine)  # los nuevos, en su orden
+        data["events"][:] = events
+        merged = dict(fresh.get("prefs", {}))
+        if prefs is not None:
+            saved = getattr(data, "saved_prefs", None)
+            base = json.loads(saved) if saved else {}
+            local = data.get("prefs", {})
+            merged.update((k, v) for k, v in local.items() if base.get(k, _MISSING) != v)
+            for k in base.keys() - local.keys():
+                merged.pop(k, None)
+        data["prefs"] = merged
+        data["version"] = fresh.get("version", 0)
+        if isinstance(data, UserData):
+            # lo traído queda limpio; lo propio se marca guardado cuando termina el commit
+            dirty = data.dirty
+            data.mark_clean()
+            data.dirty = dirty
+            data.positions = {e["id"]: i for i, e in enumerate(events)}
+            data.rebased = True
+        return _dump(merged) if prefs is not None else None
+
+    def _commit(self, username, data, prefs=None, upserts=(), deletes=()):
+        merged = []
+
+        def on_conflict(fresh):
+            merged.append(self._rebase(data, fresh, prefs, upserts, deletes))
+            return merged[0]
+
+        self.backend.commit(username, data, data.get("version", 0), prefs=prefs, upserts=upserts, deletes=deletes,
+                            on_conflict=on_conflict)
+        if merged:
+            prefs = merged[0]
+        data["version"] = data.get("version", 0) + 1
+        for listener in self._listeners:
+            listener(username, data, [e for e, _ in upserts], list(deletes), bool(merged))
+        if isinstance(data, UserData):
+            if prefs is not None:
+                data.saved_prefs = prefs
+            for e, _ in upserts:
+                data.saved_ids.add(e["id"])
+                data.dirty.discard(e["id"])
+            for i in deletes:
+                data.saved_ids.discard(i)
+                data.dirty.discard(i)
+
+    def save(self, username, data):
+        """Persiste solo lo que cambió desde la carga: las prefs (comparadas con las guardadas) y los eventos
+        marcados con touch(). Una rerun sin cambios no escribe nada ni serializa eventos. Si la lista de
+        eventos se reemplazó o creció por fuera del store (o `data` es un dict simple), se guarda completa."""
+        prefs = _dump(data.get("prefs", {}))
+        prefs = prefs if prefs != getattr(data, "saved_prefs", None) else None
+        events = data.get("events", [])
+        if isinstance(data, UserData) and data.tracked():
+            upserts, deletes = [], []
+            for eid in list(data.dirty):
+                i = self._position(data, eid)
+                if i is None:
+                    deletes.append(eid)
+                else:
+                    upserts.append((events[i], _dump(events[i])))
+        else:
+            for e in events:
+                e.setdefault("id", new_event_id())
+            seen = {e["id"] for e in events}
+            upserts = [(e, _dump(e)) for e in events]
+            deletes = [i for i in getattr(data, "saved_ids", ()) if i not in seen]
+            if isinstance(data, UserData):
+                data.positions = {e["id"]: i for i, e in enumerate(events)}
+                data._events = events
+        if prefs is None and not upserts and not deletes:
+            return False
+        self._commit(username, data, prefs=prefs, upserts=upserts, deletes=deletes)
+        return True
+
+    def _commit_events(self, username, data, upserts=(), deletes=()):
+        self._commit(username, data, upserts=[(e, _dump(e)) for e in upserts], deletes=list(deletes))
+
+    def _position(self, data, event_id):
+        events = data.get("events", [])
+        positions = getattr(data, "positions", None)
+        if positions is None:
+            positions = {}
+        i = positions.get(event_id)
+        if i is None or i >= len(events) or events[i].get("id") != event_id:
+            # la lista se tocó por fuera del store: se reconstruye el mapa una vez
+            positions.clear()
+            positions.update((e.get("id"), j) for j, e in enumerate(events))
+            i = positions.get(event_id)
+        return i
+
+    def add_event(self, username, data, event):
+        event = dict(event)
+        event.setdefault("id", new_event_id())
+        events = data.setdefault("events", [])
+        if isinstance(data, UserData):
+            data.positions[event["id"]] = len(events)
+        events.append(event)
+        self._commit_events(username, data, upserts=[event])
+        return event
+
+    def add_events(self, username, data, events):
+        """Varios eventos en un solo commit (importación masiva)."""
+        events = [dict(e) for e in events]
+        target = data.setdefault("events", [])
+        for e in events:
+            e.setdefault("id", new_event_id())
+            if isinstance(data, UserData):
+                data.positions[e["id"]] = len(target)
+            target.append(e)
+        if events:
+            self._commit_events(username, data, upserts=events)
+        return events
+
+    def update_event(self, username, data, event_id, changes):
+        i = self._position(data, event_id)
+        if i is None:
+            return None
+        e = data["events"][i]
+        e.update(changes)
+        e["id"] = event_id
+        self._commit_events(username, data, upserts=[e])
+        return e
+
+    def delete_event(self, username, data, event_id):
+        i = self._position(data, event_id)
+        if i is None:
+            return None
+        events = data["events"]
+        # swap con el último: borrar no desplaza la lista (el orden lo da el índice por fecha)
+        e = events[i]
+        last = events.pop()
+        if last is not e:
+            events[i] = last
+            if isinstance(data, UserData):
+                data.positions[last["id"]] = i
+        if isinstance(data, UserData):
+            data.positions.pop(event_id, None)
+        self._commit_events(username, data, deletes=[event_id])
+        return e
+
+    def list_users(self):
+        return self.backend.list_users()
+
+    def version(self, username):
+        return self.backend.version(username)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_store():
+    """Store compartido por el proceso; ANIMA_STORAGE=json mantiene los archivos calendar_<user>.json."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            kind = os.getenv("ANIMA_STORAGE", "sqlite").lower()
+            if kind == "json":
+                backend = JsonBackend(os.getenv("ANIMA_DATA_DIR", "."))
+            else:
+                backend = SqliteBackend(os.getenv("ANIMA_DB", "anima.db"), legacy_dir=os.getenv("ANIMA_DATA_DIR", "."))
+            _store = UserStore(backend)
+        return _store
@@ -0,0 +1,140 @@
+# wellbeing.py - Serie de tiempo de la encuesta de bienestar con tendencias mantenidas en cada envío
+import json, os, sqlite3, threading
+from collections import deque
+from datetime import datetime
+
+WINDOW = 7          # últimas encuestas que entran en el promedio móvil y la pendiente
+LOW_SCORE = 4.0     # promedio bajo el cual una encuesta cuenta como "baja"
+LOW_STREAK = 2      # encuestas bajas seguidas que activan la alerta
+FALLING_SLOPE = -0.5  # puntos por encuesta: caída sostenida
+DIMENSIONS = ("energia", "animo", "conc", "motiv")
+
+
+class TrendStats:
+    """Promedio móvil, pendiente (mínimos cuadrados) y racha de puntajes bajos sobre las últimas WINDOW encuestas.
+
+    Se actualiza en O(1) por encuesta con sumas deslizantes: al entrar un valor nuevo sale el más antiguo
+    y todas las x bajan en 1 (Sxy -= Sy). Se guarda como una fila por usuario, nunca se relee el historial.
+    """
+
+    def __init__(self, window=WINDOW, state=None):
+        state = state or {}
+        self.window = window
+        self.count = state.get("count", 0)
+        self.values = deque(state.get("values", []), maxlen=window)
+        self.sum_y = state.get("sum_y", 0.0)
+        self.sum_xy = state.get("sum_xy", 0.0)  # x = posición dentro de la ventana (0 = la más antigua)
+        self.streak = state.get("streak", 0)
+        self.last = state.get("last")
+        self.last_at = state.get("last_at")
+
+    def push(self, prom, when):
+        if len(self.values) == self.window:
+            oldest = self.values[0]  # x = 0, no aporta a Sxy
+            self.sum_y -= oldest
+            self.sum_xy -= self.sum_y  # las que quedan se corren una posición
+        self.values.append(prom)
+        self.sum_y += prom
+        self.sum_xy += (len(self.values) - 1) * prom
+        self.count += 1
+        self.streak = self.streak + 1 if prom < LOW_SCORE else 0
+        self.last, self.last_at = prom, when
+
+    @property
+    def average(self):
+        return self.sum_y / len(self.values) if self.values else None
+
+    @property
+    def slope(self):
+        n = len(self.values)
+        if n < 3:
+            return 0.0
+        sum_x = n * (n - 1) / 2
+        sum_xx = (n - 1) * n * (2 * n - 1) / 6
+        return (n * self.sum_xy - sum_x * self.sum_y) / (n * sum_xx - sum_x * sum_x)
+
+    def risk_reasons(self):
+        """Motivos de alerta según la tendencia (lista vacía si no hay riesgo)."""
+        reasons = []
+        if self.last is not None and self.last < LOW_SCORE:
+            reasons.append("tu última encuesta salió baja")
+        if self.streak >= LOW_STREAK:
+            reasons.append(f"llevas {self.streak} encuestas seguidas con puntaje bajo")
+        if self.slope <= FALLING_SLOPE and self.average is not None and self.average < 6:
+            reasons.append("tu energía y ánimo vienen bajando en las últimas encuestas")
+        return reasons
+
+    def state(self):
+        return {"count": self.count, "values": list(self.values), "sum_y": self.sum_y, "sum_xy": self.sum_xy,
+                "streak": self.streak, "last": self.last, "last_at": self.last_at}
+
+
+class SurveyStore:
+    """Encuestas de todos los usuarios (SQLite) + una fila de TrendStats por usuario, actualizada en la misma transacción."""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS surveys (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user TEXT NOT NULL,
+        created TEXT NOT NULL,
+        energia INTEGER, animo INTEGER, conc INTEGER, motiv INTEGER,
+        prom REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS surveys_user_id ON surveys (user, id);
+    CREATE TABLE IF NOT EXISTS survey_trends (
+        user TEXT PRIMARY KEY,
+        state TEXT NOT NULL
+    );
+    """
+
+    def __init__(self, path="surveys.db"):
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+
+    def _load_trend(self, user):
+        row = self.conn.execute("SELECT state FROM survey_trends WHERE user=?", (user,)).fetchone()
+        return TrendStats(state=json.loads(row[0]) if row else None)
+
+    def trend(self, user):
+        with self._lock:
+            return self._load_trend(user)
+
+    def add(self, user, answers, when=None):
+        """Guarda una encuesta ({energia, animo, conc, motiv, prom}) y devuelve el TrendStats actualizado."""
+        created = (when or datetime.now()).isoformat(timespec="seconds")
+        with self._lock:
+            c = self.conn
+            c.execute("BEGIN IMMEDIATE")
+            try:
+                c.execute("INSERT INTO surveys (user, created, energia, animo, conc, motiv, prom) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                          (user, created, *(answers.get(k) for k in DIMENSIONS), answers["prom"]))
+                trend = self._load_trend(user)
+                trend.push(answers["prom"], created)
+                c.execute("INSERT INTO survey_trends (user, state) VALUES (?, ?) ON CONFLICT(user) DO UPDATE SET state=excluded.state",
+                          (user, json.dumps(trend.state())))
+                c.execute("COMMIT")
+            except BaseException:
+                c.execute("ROLLBACK")
+                raise
+        return trend
+
+    def recent(self, user, limit=30):
+        """Últimas `limit` encuestas en orden cronológico (para el gráfico)."""
+        with self._lock:
+            rows = self.conn.execute("SELECT created, energia, animo, conc, motiv, prom FROM surveys WHERE user=? ORDER BY id DESC LIMIT ?",
+                                     (user, limit)).fetchall()
+        rows.reverse()
+        return [dict(zip(("created",) + DIMENSIONS + ("prom",), r)) for r in rows]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_survey_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SurveyStore(os.getenv("ANIMA_SURVEY_DB", "surveys.db"))
+        return _store